@@ -2,6 +2,7 @@ import shutil
 import io
 import fnmatch
 from zipfile import PyZipFile
+from Utilities.parallel_unzip import get_members, extract_members
 from Utilities.unpyc3 import decompile
 from settings import *
 
@@ -10,20 +11,23 @@ def decompile_dir(rootPath):
     pattern = '*.pyc'
     for root, dirs, files in os.walk(rootPath):
         for filename in fnmatch.filter(files, pattern):
-            p = str(os.path.join(root, filename))
-            try:
-                print('Decompiling \'{}\''.format(p))
-                py = decompile(p)
-                with io.open(p.replace('.pyc', '.py'), 'w') as output_py:
-                    for statement in py.statements:
-                        try:
-                            output_py.write(str(statement) + '\r')
-                        except Exception as ex:
-                            print(statement.__class__)
-                            raise ex
-            except Exception as ex:
-                print("FAILED to decompile %s" % p)
-                print(ex)
+            decompile_pyc_file(str(os.path.join(root, filename)))
+
+
+def decompile_pyc_file(p):
+    try:
+        print('Decompiling \'{}\''.format(p))
+        py = decompile(p)
+        with io.open(p.replace('.pyc', '.py'), 'w') as output_py:
+            for statement in py.statements:
+                try:
+                    output_py.write(str(statement) + '\r')
+                except Exception as ex:
+                    print(statement.__class__)
+                    raise ex
+    except Exception as ex:
+        print("FAILED to decompile %s" % p)
+        print(ex)
 
 
 def decompile_file(file_path, throw_on_error=True) -> bool:
@@ -45,24 +49,33 @@ def decompile_file(file_path, throw_on_error=True) -> bool:
 script_package_types = ['*.zip', '*.ts4script']
 
 
-def extract_subfolder(root, filename, ea_folder, decompile_files=True):
+# Copy a script package to the EA folder, returns the members to extract from the copy
+def get_script_package_members(root, filename, ea_folder):
     src = os.path.join(root, filename)
     dst = os.path.join(ea_folder, filename)
     if src != dst:
         shutil.copyfile(src, dst)
-    zip = PyZipFile(dst)
-    out_folder = os.path.join(ea_folder, os.path.splitext(filename)[0])
-    zip.extractall(out_folder)
-    if decompile_files:
-        decompile_dir(out_folder)
-    pass
+    return get_members(dst, os.path.join(ea_folder, os.path.splitext(filename)[0]))
+
+
+# Extract the members in parallel, decompiling each .pyc file as soon as it has been extracted
+def extract_script_package_members(members, decompile_files=True):
+    for member, path in extract_members(members):
+        if decompile_files and fnmatch.fnmatch(os.path.basename(path), '*.pyc'):
+            decompile_pyc_file(path)
+
+
+def extract_subfolder(root, filename, ea_folder, decompile_files=True):
+    extract_script_package_members(get_script_package_members(root, filename, ea_folder), decompile_files)
 
 
-def extract_folder(ea_folder, gameplay_folder):
+def extract_folder(ea_folder, gameplay_folder, decompile_files=True):
+    members = []
     for root, dirs, files in os.walk(gameplay_folder):
         for ext_filter in script_package_types:
             for filename in fnmatch.filter(files, ext_filter):
-                extract_subfolder(root, filename, ea_folder)
+                members += get_script_package_members(root, filename, ea_folder)
+    extract_script_package_members(members, decompile_files)
 
 
 def compile_module(mod_creator_name=None, root=None, mod_scripts_folder=None, mod_name=None, ignore_folders=None, include_folders=None):
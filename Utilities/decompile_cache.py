@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Default upper bound on the total size of the cache folder, in bytes
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Cache entries are stored as a single JSON header line followed by the .py file contents
+ENTRY_EXTENSION = '.entry'
+
+_file_versions = {}
+
+
+# Returns a short content hash of a decompiler module or executable.  Upgrading either
+# decompiler changes this value and so invalidates every cache entry it produced.
+def file_version(path) -> str:
+    if not path:
+        return ''
+    path = os.path.realpath(path)
+    if path not in _file_versions:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+                digest.update(chunk)
+        _file_versions[path] = digest.hexdigest()[:16]
+    return _file_versions[path]
+
+
+# Persistent, content addressed store of decompile results.  Entries are keyed by the hash of the
+# .pyc contents plus everything else that influences the output (decompiler name and version,
+# comparison settings, ...) so a hit can be written out as-is without decompiling again.
+#
+# Only the folder and size limit are kept on the object, so it can be handed to pool workers;
+# each worker reads and writes entries directly and the main process calls evict() at the end.
+class DecompileCache():
+    def __init__(self, cache_folder, max_size=DEFAULT_MAX_SIZE):
+        self.cache_folder = os.path.realpath(cache_folder)
+        self.max_size = max_size
+        os.makedirs(self.cache_folder, exist_ok=True)
+
+    def make_key(self, pyc_data, *settings) -> str:
+        digest = hashlib.sha256(pyc_data)
+        digest.update(json.dumps([str(setting) for setting in settings]).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_folder, key[:2], key + ENTRY_EXTENSION)
+
+    # Returns (fields, output) or None if the key is not cached, fields is the dictionary given to put()
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='UTF-8', newline='') as fp:
+                fields = json.loads(fp.readline())['fields']
+                output = fp.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        # Touch the entry so eviction discards the least recently used entries first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return fields, output
+
+    # Store the text of a .py file along with a dictionary of JSON serializable result fields
+    def put(self, key, output, fields):
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = {'fields': fields, 'created': time.time()}
+        # Write to a temporary file first so concurrent workers never see a partial entry, named for the
+        # process and thread, as concurrent sessions or races can write the same entry from one process
+        temp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        with open(temp_path, 'w', encoding='UTF-8', newline='') as fp:
+            fp.write(json.dumps(header) + '\n')
+            fp.write(output)
+        os.replace(temp_path, path)
+
+    # Remove the least recently used entries until the cache fits within max_size.
+    # Returns the number of entries removed.
+    def evict(self) -> int:
+        if not self.max_size:
+            return 0
+        entries = []
+        cache_size = 0
+        for root, subFolders, files in os.walk(self.cache_folder):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                cache_size += stat.st_size
+        removed = 0
+        entries.sort()
+        for mtime, size, path in entries:
+            if cache_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            cache_size -= size
+            removed += 1
+        return removed
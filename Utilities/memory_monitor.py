@@ -0,0 +1,176 @@
+# Memory monitoring for the decompile "threads"
+#
+# At least one TS4 module makes py37dec use far too much memory, and unpyc3 keeps the whole Suite tree
+# of a module in memory while decompiling it.  The resident set size (RSS) of each decompile is polled
+# so its peak can be recorded, and a decompile that grows past the memory limit is stopped:
+#   - unpyc3 runs in the "thread" process itself, a watchdog thread raises MemoryLimitExceeded in the
+#     decompiling thread.  The limit applies to the growth of the process RSS during the decompile, as
+#     memory freed by earlier files is not necessarily returned to the OS.
+#   - py37dec runs in a child process, which is killed once its RSS exceeds the limit.
+#
+# The RSS is read with psutil if it is installed, otherwise from /proc.  Without either the RSS is
+# reported as 0 and no limit is enforced.
+#
+# The same mechanisms are used to cancel a decompile that is no longer needed, when racing both
+# decompilers against each other.
+import contextlib
+import ctypes
+import os
+import subprocess
+import threading
+import time
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Seconds between RSS samples
+POLL_INTERVAL = 0.05
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+# Raised in a decompile that exceeded the memory limit, args[0] is the peak RSS in bytes.  Like
+# KeyboardInterrupt these are not Exceptions, as unpyc3 swallows an Exception raised while it decompiles
+# an instruction and carries on with the next one.
+class MemoryLimitExceeded(BaseException):
+    pass
+
+# Raised in a decompile that was cancelled with MemoryWatchdog.cancel() or a cancel event
+class Cancelled(BaseException):
+    pass
+
+
+# Returns whether the RSS of processes can be read on this system
+def is_available() -> bool:
+    return psutil is not None or os.path.isfile('/proc/self/statm')
+
+# Returns the RSS in bytes of the given process (default the current one), or 0 if it cannot be read
+def get_rss(pid=None) -> int:
+    pid = pid or os.getpid()
+    if psutil:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return 0
+    try:
+        with open('/proc/{}/statm'.format(pid), 'r') as fp:
+            return int(fp.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _set_async_exc(thread_id, exception):
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), ctypes.py_object(exception) if exception else None)
+
+
+# The limit, baseline and peak RSS of one thread inside MemoryWatchdog.watch()
+class _Watch():
+    def __init__(self, limit):
+        self.limit = limit
+        self.base_rss = get_rss()
+        self.peak_rss = self.base_rss
+        self.interrupted = False
+
+
+# Polls the RSS of the current process while threads are inside watch(), recording the peak of each and
+# raising MemoryLimitExceeded in a thread if the RSS grows by more than its limit.  Several threads can
+# be watched at once, e.g. by concurrent single threaded decompile sessions, but the RSS is that of the
+# whole process, so the memory used by one of them counts towards the limits of the others.
+class MemoryWatchdog():
+    def __init__(self):
+        self.lock = threading.Lock()
+        # The _Watch of every watched thread, keyed by thread id
+        self.watches = {}
+        # The _Watch of the last watch() of each thread, for peak_rss
+        self.last_watch = threading.local()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Peak RSS in bytes during the current or last watch() of the calling thread
+    @property
+    def peak_rss(self):
+        watch = getattr(self.last_watch, 'watch', None)
+        return watch.peak_rss if watch else 0
+
+    # Watch the calling thread for the duration of the with block, limit is in bytes (0 = no limit)
+    @contextlib.contextmanager
+    def watch(self, limit=0):
+        thread_id = threading.get_ident()
+        watch = _Watch(limit)
+        self.last_watch.watch = watch
+        with self.lock:
+            self.watches[thread_id] = watch
+        try:
+            yield self
+        finally:
+            with self.lock:
+                # The block may have finished before the exception was delivered, withdraw it
+                if watch.interrupted:
+                    _set_async_exc(thread_id, None)
+                del self.watches[thread_id]
+
+    # Stop the given watched thread, if it is being watched, by raising Cancelled in it
+    def cancel(self, thread_id):
+        with self.lock:
+            watch = self.watches.get(thread_id)
+            if watch is not None and not watch.interrupted:
+                watch.interrupted = True
+                _set_async_exc(thread_id, Cancelled)
+
+    def _run(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            with self.lock:
+                if not self.watches:
+                    continue
+                rss = get_rss()
+                for thread_id, watch in self.watches.items():
+                    if watch.interrupted:
+                        continue
+                    watch.peak_rss = max(watch.peak_rss, rss)
+                    if watch.limit and rss - watch.base_rss > watch.limit:
+                        watch.interrupted = True
+                        _set_async_exc(thread_id, MemoryLimitExceeded)
+
+
+_watchdog = None
+
+
+# Returns the watchdog of the current process, so every decompile "thread" in the pool has its own
+def get_watchdog() -> MemoryWatchdog:
+    global _watchdog
+    if _watchdog is None or _watchdog[0] != os.getpid():
+        _watchdog = (os.getpid(), MemoryWatchdog())
+    return _watchdog[1]
+
+
+# Like subprocess.run() with capture_output=True, but polls the RSS of the child process and kills it
+# if it exceeds limit bytes (0 = no limit).  Returns the CompletedProcess and the peak RSS of the child.
+# Raises subprocess.TimeoutExpired on a timeout, MemoryLimitExceeded if the limit was exceeded and
+# Cancelled if the optional cancel_event (a threading.Event) was set.
+def run_with_memory_limit(args, timeout=None, limit=0, encoding=None, cancel_event=None):
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    peak_rss = 0
+    with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding=encoding) as process:
+        while True:
+            try:
+                # No output is lost when communicate() times out, it can simply be called again
+                stdout, stderr = process.communicate(timeout=POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            peak_rss = max(peak_rss, get_rss(process.pid))
+            if limit and peak_rss > limit:
+                process.kill()
+                process.communicate()
+                raise MemoryLimitExceeded(peak_rss)
+            if deadline is not None and time.perf_counter() > deadline:
+                process.kill()
+                process.communicate()
+                raise subprocess.TimeoutExpired(args, timeout)
+            if cancel_event is not None and cancel_event.is_set():
+                process.kill()
+                process.communicate()
+                raise Cancelled()
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr), peak_rss
@@ -0,0 +1,95 @@
+# Parallel extraction of Zip file members
+#
+# ZipFile.extractall() extracts one member after another, and a ZipFile handle cannot be shared between
+# threads.  Here the members are spread over several threads, each with its own handle on every Zip file
+# it reads from.  Decompressing and writing both release the GIL, so threads are enough.  The directory
+# tree is created up front, and each member is handed back as soon as it has been extracted, so work on
+# it can start while the rest are still being extracted.
+import os
+import queue
+import shutil
+import threading
+import zipfile
+
+DEFAULT_MAX_THREADS = min(8, os.cpu_count() or 1)
+
+# Size of the buffer used to copy each member to its file
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+# Returns the path a member is extracted to in folder, sanitized the same way as ZipFile.extract()
+def get_member_path(folder, info):
+    arcname = info.filename.replace('/', os.path.sep)
+    if os.path.altsep:
+        arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    arcname = os.path.sep.join(part for part in arcname.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir))
+    return os.path.join(folder, arcname)
+
+# Returns the (zip filename, ZipInfo, destination folder) of every member of a Zip file
+def get_members(zip_filename, folder):
+    with zipfile.ZipFile(zip_filename) as zip:
+        return [(zip_filename, info, folder) for info in zip.infolist()]
+
+# Extracts members, given as tuples starting with (zip filename, ZipInfo, destination folder), using up to
+# max_threads threads.  Yields (member, extracted path) for every file member in order of completion, the
+# first members given are started first.  Directory members are created but not yielded.  The first error
+# extracting a member is raised once the members already being extracted have finished.
+def extract_members(members, max_threads=DEFAULT_MAX_THREADS):
+    # Create the directory tree once, rather than checking it for every member
+    folders = set()
+    files = []
+    for member in members:
+        path = get_member_path(member[2], member[1])
+        if member[1].is_dir():
+            folders.add(path)
+        else:
+            folders.add(os.path.dirname(path))
+            files.append((member, path))
+    for folder in sorted(folders):
+        os.makedirs(folder, exist_ok=True)
+
+    tasks = queue.Queue()
+    for file in files:
+        tasks.put(file)
+    extracted = queue.Queue()
+
+    def extract():
+        zips = {}
+        try:
+            while True:
+                try:
+                    member, path = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    zip_filename, info = member[0], member[1]
+                    if zip_filename not in zips:
+                        zips[zip_filename] = zipfile.ZipFile(zip_filename)
+                    with zips[zip_filename].open(info) as src, open(path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+                    extracted.put((member, path, None))
+                except Exception as ex:
+                    extracted.put((member, path, ex))
+        finally:
+            for zip in zips.values():
+                zip.close()
+
+    threads = [threading.Thread(target=extract, daemon=True) for i in range(min(max_threads, len(files)))]
+    for thread in threads:
+        thread.start()
+    try:
+        for i in range(len(files)):
+            member, path, ex = extracted.get()
+            if ex is not None:
+                raise ex
+            yield member, path
+    finally:
+        # On an error, or when the caller stops early, the members not yet started are dropped
+        while True:
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+        for thread in threads:
+            thread.join()
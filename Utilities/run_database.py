@@ -0,0 +1,159 @@
+# SQLite database of decompile runs
+#
+# Every decompile run with a database file records the game version, decompiler and settings
+# of the run, and the result, timings, hashes and issue summary of every file, so results can be compared
+# across runs and game patches.  Run this file as a script to query the database:
+#
+#   run_database.py DATABASE runs                      list the recorded runs
+#   run_database.py DATABASE regressions [RUN] [RUN]   files whose result got worse (default the last two runs)
+#   run_database.py DATABASE changes [RUN] [RUN]       every file whose result changed, was added or removed
+#   run_database.py DATABASE slowest [RUN] [-n N]      the N slowest files of a run (default the last run)
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+
+RESULT_NAMES = ['PERFECT', 'GOOD', 'SYNTAX', 'FAILED', 'TIMEOUT']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started TEXT NOT NULL,
+    elapsed REAL,
+    game_version TEXT,
+    decompiler TEXT,
+    settings TEXT,
+    files INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    module TEXT NOT NULL,
+    result INTEGER NOT NULL,
+    decompiler TEXT,
+    cached INTEGER,
+    size INTEGER,
+    decompile_time REAL,
+    analyze_time REAL,
+    actual_cost REAL,
+    peak_rss INTEGER,
+    code_hash TEXT,
+    issues TEXT,
+    PRIMARY KEY (run_id, module)
+);
+CREATE INDEX IF NOT EXISTS results_module ON results (module, run_id);
+CREATE INDEX IF NOT EXISTS results_cost ON results (run_id, actual_cost);
+CREATE INDEX IF NOT EXISTS results_code_hash ON results (code_hash);
+CREATE INDEX IF NOT EXISTS runs_game_version ON runs (game_version);
+'''
+
+
+# Returns the game version from the GameVersion.txt file in one of the given folders, or None
+def get_game_version(folders):
+    for folder in folders:
+        try:
+            with open(os.path.join(folder, 'GameVersion.txt'), 'rb') as fp:
+                match = re.search(rb'\d+(\.\d+)+', fp.read())
+        except OSError:
+            continue
+        if match:
+            return match.group(0).decode('ascii')
+    return None
+
+def connect(filename):
+    connection = sqlite3.connect(filename)
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.executescript(SCHEMA)
+    return connection
+
+# Record a run and the DecompileResultData of every file in it, returns the id of the new run
+def record_run(filename, started, elapsed, game_version, decompiler, settings, results):
+    connection = connect(filename)
+    try:
+        with connection:
+            cursor = connection.execute('INSERT INTO runs (started, elapsed, game_version, decompiler, settings, files) VALUES (?, ?, ?, ?, ?, ?)',
+                                        (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started)), elapsed, game_version, decompiler, json.dumps(settings), len(results)))
+            run_id = cursor.lastrowid
+            connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                   [(run_id, result.module or result.pycFilename, result.result, result.decompiler, int(result.cached), result.size, result.decompile_time,
+                                     result.analyze_time, result.actual_cost, result.peak_rss, result.code_hash, ', '.join(result.mismatched_functions)) for result in results])
+    finally:
+        connection.close()
+    return run_id
+
+def get_runs(connection):
+    return connection.execute('SELECT id, started, elapsed, game_version, decompiler, files FROM runs ORDER BY id').fetchall()
+
+# Returns the ids of count runs, the given runs preceded by the runs recorded before them.
+# With no runs given, ends with the last run recorded.
+def get_run_ids(connection, run_ids, count):
+    run_ids = list(run_ids[:count])
+    if not run_ids:
+        last_id, = connection.execute('SELECT MAX(id) FROM runs').fetchone()
+        if last_id is None:
+            raise ValueError('No runs recorded')
+        run_ids = [last_id]
+    while len(run_ids) < count:
+        previous_id, = connection.execute('SELECT MAX(id) FROM runs WHERE id < ?', (run_ids[0],)).fetchone()
+        if previous_id is None:
+            raise ValueError('No run recorded before run {}'.format(run_ids[0]))
+        run_ids.insert(0, previous_id)
+    return run_ids
+
+# Returns (module, old result, new result) for every file in both runs whose result is worse in new_run
+def get_regressions(connection, old_run, new_run):
+    return connection.execute('''SELECT new.module, old.result, new.result FROM results AS new
+                                 JOIN results AS old ON old.module = new.module AND old.run_id = ?
+                                 WHERE new.run_id = ? AND new.result > old.result ORDER BY new.module''', (old_run, new_run)).fetchall()
+
+# Returns (module, old result, new result) for every file whose result differs between the runs,
+# a result is None for a file that is not in that run
+def get_changes(connection, old_run, new_run):
+    return connection.execute('''SELECT new.module, old.result, new.result FROM results AS new
+                                 LEFT JOIN results AS old ON old.module = new.module AND old.run_id = ?
+                                 WHERE new.run_id = ? AND (old.result IS NULL OR old.result != new.result)
+                                 UNION ALL
+                                 SELECT old.module, old.result, NULL FROM results AS old
+                                 WHERE old.run_id = ? AND NOT EXISTS (SELECT 1 FROM results AS new WHERE new.run_id = ? AND new.module = old.module)
+                                 ORDER BY 1''', (old_run, new_run, old_run, new_run)).fetchall()
+
+# Returns (module, actual cost, decompile time, size, result) of the slowest files of a run
+def get_slowest(connection, run_id, limit=20):
+    return connection.execute('''SELECT module, actual_cost, decompile_time, size, result FROM results
+                                 WHERE run_id = ? ORDER BY actual_cost DESC LIMIT ?''', (run_id, limit)).fetchall()
+
+def _result_name(result):
+    return RESULT_NAMES[result] if result is not None and 0 <= result < len(RESULT_NAMES) else '-'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('database', metavar='DATABASE', help='run database file')
+    parser.add_argument('query', choices=['runs', 'regressions', 'changes', 'slowest'], help='query to run')
+    parser.add_argument('run_ids', nargs='*', type=int, metavar='RUN', help='run ids to query (default the last runs)')
+    parser.add_argument('-n', nargs=1, type=int, metavar='N', default=[20], dest='limit', help='number of files to list for slowest (default 20)')
+    args = parser.parse_args()
+    if not os.path.isfile(args.database):
+        print('Run database {} not found'.format(args.database))
+        exit()
+
+    connection = connect(args.database)
+    try:
+        if args.query == 'runs':
+            for run_id, started, elapsed, game_version, decompiler, files in get_runs(connection):
+                print('{:5}  {}  {:>8.1f}s  {:16}  {:8}  {} files'.format(run_id, started, elapsed or 0, game_version or 'unknown', decompiler or '', files))
+        elif args.query == 'slowest':
+            run_id, = get_run_ids(connection, args.run_ids, 1)
+            for module, actual_cost, decompile_time, size, result in get_slowest(connection, run_id, args.limit[0]):
+                print('{:>10.3f}s  {:>10.3f}s  {:>9} bytes  {:8}  {}'.format(actual_cost, decompile_time, size, _result_name(result), module))
+        else:
+            old_run, new_run = get_run_ids(connection, args.run_ids, 2)
+            rows = get_regressions(connection, old_run, new_run) if args.query == 'regressions' else get_changes(connection, old_run, new_run)
+            print('{} files from run {} to run {}'.format(len(rows), old_run, new_run))
+            for module, old_result, new_result in rows:
+                print('{:8} -> {:8}  {}'.format(_result_name(old_result), _result_name(new_result), module))
+    except ValueError as ex:
+        print(ex)
+    finally:
+        connection.close()
@@ -0,0 +1,61 @@
+import json
+import os
+
+# Decompile cost in seconds per byte of .pyc file assumed for modules with no recorded timings,
+# until the history has enough timings to learn the actual rate.
+DEFAULT_SECONDS_PER_BYTE = 0.000002
+
+
+# Recorded decompile times of each module from previous runs, keyed by the module's path relative to
+# the source folder (e.g. 'simulation/objects/game_object.pyc') so they carry over between game patches.
+# Used to estimate the cost of each module up front for scheduling and timeouts.
+class TimingHistory():
+    def __init__(self, filename):
+        self.filename = filename
+        self.modules = {}
+        try:
+            with open(filename, 'r', encoding='UTF-8') as fp:
+                self.modules = json.load(fp)
+        except (OSError, ValueError):
+            pass
+        self._seconds_per_byte = {}
+
+    def get(self, module):
+        return self.modules.get(module)
+
+    # Record the size of a module and how long its decompile and the whole job (including verification
+    # and any retry) took, in seconds.  py37dec_time is how long py37dec ran on it, if it was used.
+    def record(self, module, size, decompile_time, total_time, py37dec_time=-1):
+        self.modules[module] = {'size': size, 'decompile_time': decompile_time, 'total_time': total_time}
+        if py37dec_time >= 0:
+            self.modules[module]['py37dec_time'] = py37dec_time
+        self._seconds_per_byte = {}
+
+    def save(self):
+        folder = os.path.dirname(self.filename)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.filename, 'w', encoding='UTF-8') as fp:
+            json.dump(self.modules, fp)
+
+    # Returns whether any module has a recording of the given timing
+    def has_timing(self, timing) -> bool:
+        return any(timing in timings for timings in self.modules.values())
+
+    # Average cost in seconds per byte of the given timing over every recorded module, for modules
+    # with no timings yet
+    def seconds_per_byte(self, timing='total_time') -> float:
+        if timing not in self._seconds_per_byte:
+            recorded = [timings for timings in self.modules.values() if timings.get(timing, -1) >= 0]
+            total_size = sum(timings['size'] for timings in recorded)
+            total_time = sum(timings[timing] for timings in recorded)
+            self._seconds_per_byte[timing] = total_time / total_size if total_size and total_time > 0 else DEFAULT_SECONDS_PER_BYTE
+        return self._seconds_per_byte[timing]
+
+    # Estimated cost in seconds of the given timing ('total_time', 'decompile_time' or 'py37dec_time')
+    # for a module of the given size.  Recorded timings are scaled by the change in size since they were recorded.
+    def estimate(self, module, size, timing='total_time') -> float:
+        timings = self.modules.get(module)
+        if timings and timings['size'] and timings.get(timing, -1) >= 0:
+            return timings[timing] * size / timings['size']
+        return size * self.seconds_per_byte(timing)
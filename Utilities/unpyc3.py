@@ -27,9 +27,30 @@ from typing import Union
 __all__ = ['decompile']
 
 
-def set_trace(trace_function):
-    global current_trace
+# Trace levels, each level includes the ones below it
+TRACE_OFF = 0
+# The code objects being decompiled
+TRACE_CODE = 1
+# The bytecode listing of each code object
+TRACE_LISTING = 2
+
+
+def set_trace(trace_function, level=TRACE_LISTING, code_filter=None):
+    """
+    Send trace output up to the given level to trace_function(*args).
+    The args are objects to be formatted with str() by trace_function,
+    so nothing is formatted unless it is actually output.  If code_filter
+    is given only code objects for which code_filter(code_obj) is true
+    are traced, or if it is a string those with that name.  Tracing is
+    off without a trace_function.
+    """
+    global current_trace, trace_level, trace_filter
     current_trace = trace_function if trace_function else _trace
+    trace_level = level if trace_function else TRACE_OFF
+    if isinstance(code_filter, str):
+        code_name = code_filter
+        code_filter = lambda code_obj: code_obj.co_name == code_name
+    trace_filter = code_filter
 
 
 def get_trace():
@@ -37,6 +58,14 @@ def get_trace():
     return None if current_trace == _trace else current_trace
 
 
+def is_tracing(level, code_obj=None):
+    """
+    Return whether trace output of the given level is wanted for
+    code_obj.  Guard any trace output that takes work to produce with it.
+    """
+    return trace_level >= level and (trace_filter is None or code_obj is None or trace_filter(code_obj))
+
+
 def trace(*args):
     global current_trace
     if current_trace:
@@ -48,6 +77,8 @@ def _trace(*args):
 
 
 current_trace = _trace
+trace_level = TRACE_OFF
+trace_filter = None
 
 # TODO:
 # - Support for keyword-only arguments
@@ -56,11 +87,14 @@ current_trace = _trace
 
 import dis
 from array import array
+from collections import Counter
+from bisect import bisect_left
 from opcode import opname, opmap, HAVE_ARGUMENT, cmp_op
 import inspect
 
 import struct
 import sys
+import threading
 
 # Masks for code object's co_flag attribute
 VARARGS = 4
@@ -71,7 +105,7 @@ for name, val in opmap.items():
     globals()[name] = val
 
 # These opcodes will generate a statement. This is used in the first
-# pass (in Code.find_else) to find which POP_JUMP_IF_* instructions
+# pass (in Code.find_jumps) to find which POP_JUMP_IF_* instructions
 # are jumps to the else clause of an if statement
 stmt_opcodes = {
     SETUP_LOOP, BREAK_LOOP, CONTINUE_LOOP,
@@ -101,6 +135,10 @@ else_jump_opcodes = (
     SETUP_LOOP, RAISE_VARARGS, POP_TOP
 )
 
+# Relative and absolute jump opcodes
+jrel_opcodes = frozenset(dis.hasjrel)
+jabs_opcodes = frozenset(dis.hasjabs)
+
 # These opcodes indicate for loop rather than while loop
 for_jump_opcodes = (
     GET_ITER, FOR_ITER, GET_ANEXT
@@ -271,34 +309,77 @@ class Stack:
             return self._stack[-count:]
 
 
-def code_walker(code):
+def _decode_wordcode(code):
+    """
+    Decode Python 3.6+ wordcode, where every instruction is an opcode
+    byte and an argument byte.  An EXTENDED_ARG is merged into the
+    instruction following it, which takes the offset of the EXTENDED_ARG.
+    """
+    opcode_bytes = code[0::2]
+    opcodes = array('B', opcode_bytes)
+    args = array('B', code[1::2])
+    if EXTENDED_ARG not in opcode_bytes:
+        # Without an EXTENDED_ARG every argument fits in a byte and the
+        # offsets are simply every other byte
+        return range(0, len(code), 2), opcodes, args
+    # Copy the runs of instructions between the EXTENDED_ARGs, which are rare
+    offsets = array('l')
+    merged_opcodes = array('B')
+    merged_args = array('l')
+    start = 0
+    i = opcode_bytes.find(EXTENDED_ARG)
+    while i != -1:
+        offsets.extend(range(start * 2, i * 2, 2))
+        merged_opcodes.extend(opcodes[start:i])
+        merged_args.extend(args[start:i].tolist())
+        offsets.append(i * 2)
+        merged_opcodes.append(opcodes[i + 1])
+        merged_args.append(args[i] << 8 | args[i + 1])
+        start = i + 2
+        i = opcode_bytes.find(EXTENDED_ARG, start)
+    offsets.extend(range(start * 2, len(code), 2))
+    merged_opcodes.extend(opcodes[start:])
+    merged_args.extend(args[start:].tolist())
+    return offsets, merged_opcodes, merged_args
+
+
+def _decode_bytecode(code):
+    """
+    Decode pre-3.6 bytecode, where only instructions with an argument
+    have two argument bytes.  An instruction without an argument gets
+    the argument of the instruction before it.
+    """
+    offsets = array('l')
+    opcodes = array('B')
+    args = array('l')
     l = len(code)
-    code = array('B', code)
     oparg = 0
     i = 0
     extended_arg = 0
-
     while i < l:
         op = code[i]
-        offset = 1
-        if sys.version_info >= (3, 6):
-            oparg = code[i + offset]
-            offset += 1
-        elif op >= HAVE_ARGUMENT:
-            oparg = code[i + offset] + code[i + offset + 1] * 256 + extended_arg
+        offsets.append(i)
+        i += 1
+        if op >= HAVE_ARGUMENT:
+            oparg = code[i] + code[i + 1] * 256 + extended_arg
             extended_arg = 0
-            offset += 2
+            i += 2
         if op == EXTENDED_ARG:
-            if sys.version_info >= (3, 6):
-                op = code[i + offset]
-                offset += 1
-                oparg <<= 8
-                oparg |= code[i + offset]
-                offset += 1
-            else:
-                extended_arg = oparg * 65536
-        yield i, (op, oparg)
-        i += offset
+            extended_arg = oparg * 65536
+        opcodes.append(op)
+        args.append(oparg)
+    return offsets, opcodes, args
+
+
+# decode_instructions(code) returns parallel arrays of the offset, opcode
+# and argument of each instruction in the bytes of a code object
+decode_instructions = _decode_wordcode if sys.version_info >= (3, 6) else _decode_bytecode
+
+
+def code_walker(code):
+    offsets, opcodes, args = decode_instructions(code)
+    for i in range(len(offsets)):
+        yield offsets[i], (opcodes[i], args[i])
 
 
 class CodeFlags(object):
@@ -354,79 +435,108 @@ class Code:
         self.consts = list(map(PyConst, code_obj.co_consts))
         self.names = list(map(PyName, code_obj.co_names))
         self.varnames = list(map(PyName, code_obj.co_varnames))
-        self.instr_seq = list(code_walker(code_obj.co_code))
-        self.instr_map = {addr: i for i, (addr, _) in enumerate(self.instr_seq)}
+        self.offsets, self.opcodes, self.args = decode_instructions(code_obj.co_code)
+        # The Address of each instruction, created on first use
+        self.addresses = [None] * len(self.offsets)
         self.name = code_obj.co_name
         self.globals = []
         self.nonlocals = []
-        self.jump_targets = []
-        self.find_else()
         self.find_jumps()
+        if trace_level and is_tracing(TRACE_CODE, code_obj):
+            self.trace_listing()
+        self.flags: CodeFlags = CodeFlags(code_obj.co_flags)
+
+    def trace_listing(self):
+        """Trace the code object and, at TRACE_LISTING, its bytecode listing"""
         trace('================================================')
         trace(self.code_obj)
         trace('================================================')
-        for addr in self:
-            trace(str(addr))
-            if addr.opcode in stmt_opcodes or addr.opcode in pop_jump_if_opcodes:
-                trace(' ')
-        trace('================================================')
-        self.flags: CodeFlags = CodeFlags(code_obj.co_flags)
+        if is_tracing(TRACE_LISTING, self.code_obj):
+            for addr in self:
+                trace(addr)
+                if addr.opcode in stmt_opcodes or addr.opcode in pop_jump_if_opcodes:
+                    trace(' ')
+            trace('================================================')
 
     def __getitem__(self, instr_index):
-        if 0 <= instr_index < len(self.instr_seq):
-            return Address(self, instr_index)
+        if 0 <= instr_index < len(self.offsets):
+            address = self.addresses[instr_index]
+            if address is None:
+                address = self.addresses[instr_index] = Address(self, instr_index)
+            return address
 
     def __iter__(self):
-        for i in range(len(self.instr_seq)):
-            yield Address(self, i)
+        for i in range(len(self.offsets)):
+            yield self[i]
 
     def show(self):
         for addr in self:
             print(addr)
 
     def address(self, addr):
-        return self[self.instr_map[addr]]
+        return self[self.instr_index(addr)]
 
     def iscellvar(self, i):
         return i < len(self.code_obj.co_cellvars)
 
-    def find_jumps(self):
-        for addr in self:
-            opcode, arg = addr
-            jt = addr.jump()
-            if jt:
-                self.jump_targets.append(jt)
+    def instr_index(self, addr):
+        """Return the index of the instruction at offset addr"""
+        # The offsets are in increasing order
+        i = bisect_left(self.offsets, addr)
+        if i == len(self.offsets) or self.offsets[i] != addr:
+            raise KeyError(addr)
+        return i
 
-    def find_else(self):
+    def find_jump_dest(self, instr_index):
+        """
+        Return the index of the instruction the instruction at instr_index
+        jumps to, or None if it is not a jump
+        """
+        opcode = self.opcodes[instr_index]
+        if opcode in jrel_opcodes:
+            return self.instr_index(self.offsets[instr_index + 1] + self.args[instr_index])
+        elif opcode in jabs_opcodes:
+            return self.instr_index(self.args[instr_index])
+
+    def find_jumps(self):
+        """
+        Single pass over the instructions that records the destination
+        of every jump in jump_dests (-1 for other instructions), flags
+        the jump targets in jump_target_flags and finds the else_jumps,
+        the POP_JUMP_IF_* instructions that jump to an else clause
+        """
+        opcodes = self.opcodes
+        count = len(opcodes)
+        self.jump_dests = array('l', [-1]) * count
+        self.jump_target_flags = bytearray(count)
+        # Maps instruction indexes to the else-jump they belong to
         jumps = {}
         last_jump = None
-        for addr in self:
-            opcode, arg = addr
+        for i in range(count):
+            opcode = opcodes[i]
+            dest = self.find_jump_dest(i)
+            if dest is not None:
+                self.jump_dests[i] = dest
+                self.jump_target_flags[dest] = 1
             if opcode in pop_jump_if_opcodes:
-                jump_addr = self.address(arg)
-                if (jump_addr[-1].opcode in else_jump_opcodes
-                        or jump_addr.opcode == FOR_ITER):
-                    last_jump = addr
-                    jumps[jump_addr] = addr
-            elif opcode == JUMP_ABSOLUTE:
+                if (self[dest][-1].opcode in else_jump_opcodes
+                        or opcodes[dest] == FOR_ITER):
+                    last_jump = i
+                    jumps[dest] = i
+            elif opcode == JUMP_ABSOLUTE or opcode == JUMP_FORWARD:
                 # This case is to deal with some nested ifs such as:
                 # if a:
                 # if b:
                 #         f()
                 #     elif c:
                 #         g()
-                jump_addr = self.address(arg)
-                if jump_addr in jumps:
-                    jumps[addr] = jumps[jump_addr]
-            elif opcode == JUMP_FORWARD:
-                jump_addr = addr[1] + arg
-                if jump_addr in jumps:
-                    jumps[addr] = jumps[jump_addr]
+                if dest in jumps:
+                    jumps[i] = jumps[dest]
             elif opcode in stmt_opcodes and last_jump is not None:
                 # This opcode will generate a statement, so it means
                 # that the last POP_JUMP_IF_x was an else-jump
-                jumps[addr] = last_jump
-        self.else_jumps = set(jumps.values())
+                jumps[i] = last_jump
+        self.else_jumps = {self[i] for i in jumps.values()}
 
     def get_suite(self, include_declarations=True, look_for_docstring=False) -> Suite:
         dec = SuiteDecompiler(self[0])
@@ -483,18 +593,22 @@ class Code:
 
 
 class Address:
+    """
+    An instruction in a Code.  There is only one Address per instruction,
+    obtained by indexing the Code, so Addresses compare and hash by identity.
+    """
+    __slots__ = ('code', 'index', 'addr', 'opcode', 'arg')
+
     def __init__(self, code, instr_index):
         self.code = code
         self.index = instr_index
-        self.addr, (self.opcode, self.arg) = code.instr_seq[instr_index]
-
-    def __eq__(self, other):
-        return (isinstance(other, type(self))
-                and self.code == other.code and self.index == other.index)
+        self.addr = code.offsets[instr_index]
+        self.opcode = code.opcodes[instr_index]
+        self.arg = code.args[instr_index]
 
     def __lt__(self, other):
         return other is None or (isinstance(other, type(self))
-                                 and self.code == other.code and self.index < other.index)
+                                 and self.code is other.code and self.index < other.index)
 
     def __str__(self):
         mark = "* " if self in self.code.else_jumps else "  "
@@ -539,24 +653,22 @@ class Address:
         yield self.opcode
         yield self.arg
 
-    def __hash__(self):
-        return hash((self.code, self.index))
-
     def is_else_jump(self):
         return self in self.code.else_jumps
 
     def is_jump_target(self):
-        return self in self.code.jump_targets
+        return bool(self.code.jump_target_flags[self.index])
 
-    def change_instr(self, opcode, arg=None):
-        self.code.instr_seq[self.index] = (self.addr, (opcode, arg))
+    def change_instr(self, opcode, arg=0):
+        self.code.opcodes[self.index] = self.opcode = opcode
+        self.code.args[self.index] = self.arg = arg
+        dest = self.code.find_jump_dest(self.index)
+        self.code.jump_dests[self.index] = -1 if dest is None else dest
 
     def jump(self) -> Address:
-        opcode = self.opcode
-        if opcode in dis.hasjrel:
-            return self[1] + self.arg
-        elif opcode in dis.hasjabs:
-            return self.code.address(self.arg)
+        dest = self.code.jump_dests[self.index]
+        if dest >= 0:
+            return self.code[dest]
 
     def seek(self, opcode: tuple, increment: int, end: Address = None) -> Address:
         if not isinstance(opcode, tuple):
@@ -966,7 +1078,7 @@ class PyComp(PyExpr):
         assert not defaults and not kwdefaults
         self.code = code
         code[0].change_instr(NOP)
-        last_i = len(code.instr_seq) - 1
+        last_i = len(code.offsets) - 1
         code[last_i].change_instr(NOP)
         self.annotations = annotations
 
@@ -1472,6 +1584,9 @@ class SuiteDecompiler:
     # This is put on the stack by LOAD_BUILD_CLASS
     BUILD_CLASS = object()
 
+    # The instruction handlers indexed by opcode, see make_dispatch_table()
+    dispatch = None
+
     def __init__(self, start_addr, end_addr=None, stack=None):
         self.start_addr = start_addr
         self.end_addr = end_addr
@@ -1509,22 +1624,21 @@ class SuiteDecompiler:
 
     def run(self):
         addr, end_addr = self.start_addr, self.end_addr
+        dispatch = self.dispatch
         while addr and addr < end_addr:
             try:
-                opcode, arg = addr
-                method = getattr(self, opname[opcode])
-                if opcode < HAVE_ARGUMENT:
-                    new_addr = method(addr)
-                else:
-                    new_addr = method(addr, arg)
+                new_addr = dispatch[addr.opcode](self, addr, addr.arg)
                 if new_addr is self.END_NOW:
                     break
                 elif new_addr is None:
                     new_addr = addr[1]
                 addr = new_addr
-            except:
+            except Exception as ex:
+                # Skip the instruction, but keep count of what was skipped
+                count_swallowed_exception(opname[addr.opcode])
+                if trace_level and is_tracing(TRACE_CODE, self.code.code_obj):
+                    trace('skipped', addr, repr(ex))
                 addr = addr[1]
-                continue
         return addr
 
     def write(self, template, *args):
@@ -1629,7 +1743,7 @@ class SuiteDecompiler:
                 return jump_addr
         return None
 
-    def BREAK_LOOP(self, addr):
+    def BREAK_LOOP(self, addr, arg=None):
         self.write("break")
 
     def CONTINUE_LOOP(self, addr, *argv):
@@ -1644,7 +1758,7 @@ class SuiteDecompiler:
         self.suite.add_statement(FinallyStatement(d_try.suite, d_finally.suite))
         return end_finally[1]
 
-    def END_FINALLY(self, addr):
+    def END_FINALLY(self, addr, arg=None):
         return self.END_NOW
 
     def SETUP_EXCEPT(self, addr, delta):
@@ -1716,13 +1830,13 @@ class SuiteDecompiler:
             assert end_with[1].opcode == WITH_CLEANUP_FINISH
             return end_with[3]
 
-    def POP_BLOCK(self, addr):
+    def POP_BLOCK(self, addr, arg=None):
         pass
 
-    def POP_EXCEPT(self, addr):
+    def POP_EXCEPT(self, addr, arg=None):
         return self.END_NOW
 
-    def NOP(self, addr):
+    def NOP(self, addr, arg=None):
         return
 
     def COMPARE_OP(self, addr, compare_opname):
@@ -1766,10 +1880,10 @@ class SuiteDecompiler:
     # Stack manipulation
     #
 
-    def POP_TOP(self, addr):
+    def POP_TOP(self, addr, arg=None):
         self.stack.pop().on_pop(self)
 
-    def ROT_TWO(self, addr):
+    def ROT_TWO(self, addr, arg=None):
         # special case: x, y = z, t
         if addr[2] and addr[1].opcode == STORE_NAME and addr[2].opcode == STORE_NAME:
             val = PyTuple(self.stack.pop(2))
@@ -1780,14 +1894,14 @@ class SuiteDecompiler:
             tos1, tos = self.stack.pop(2)
             self.stack.push(tos, tos1)
 
-    def ROT_THREE(self, addr):
+    def ROT_THREE(self, addr, arg=None):
         tos2, tos1, tos = self.stack.pop(3)
         self.stack.push(tos, tos2, tos1)
 
-    def DUP_TOP(self, addr):
+    def DUP_TOP(self, addr, arg=None):
         self.stack.push(self.stack.peek())
 
-    def DUP_TOP_TWO(self, addr):
+    def DUP_TOP_TWO(self, addr, arg=None):
         self.stack.push(*self.stack.peek(2))
 
     #
@@ -1918,11 +2032,11 @@ class SuiteDecompiler:
 
     # SUBSCR
 
-    def STORE_SUBSCR(self, addr):
+    def STORE_SUBSCR(self, addr, arg=None):
         expr, sub = self.stack.pop(2)
         self.store(PySubscript(expr, sub))
 
-    def DELETE_SUBSCR(self, addr):
+    def DELETE_SUBSCR(self, addr, arg=None):
         expr, sub = self.stack.pop(2)
         self.write("del {}[{}]", expr, sub)
 
@@ -1959,7 +2073,7 @@ class SuiteDecompiler:
             return addr[4]
 
 
-    def IMPORT_STAR(self, addr):
+    def IMPORT_STAR(self, addr, arg=None):
         self.POP_TOP(addr)
 
     #
@@ -1970,10 +2084,10 @@ class SuiteDecompiler:
         self.stack.pop()
         return addr[3]
 
-    def LOAD_BUILD_CLASS(self, addr):
+    def LOAD_BUILD_CLASS(self, addr, arg=None):
         self.stack.push(self.BUILD_CLASS)
 
-    def RETURN_VALUE(self, addr):
+    def RETURN_VALUE(self, addr, arg=None):
         value = self.stack.pop()
         if isinstance(value, PyConst) and value.val is None:
             if addr[1] is not None:
@@ -1984,16 +2098,16 @@ class SuiteDecompiler:
         else:
             self.write("return {}", value)
 
-    def GET_YIELD_FROM_ITER(self, addr):
+    def GET_YIELD_FROM_ITER(self, addr, arg=None):
         pass
 
-    def YIELD_VALUE(self, addr):
+    def YIELD_VALUE(self, addr, arg=None):
         if self.code.name == '<genexpr>':
             return
         value = self.stack.pop()
         self.stack.push(PyYield(value))
 
-    def YIELD_FROM(self, addr):
+    def YIELD_FROM(self, addr, arg=None):
         value = self.stack.pop()  # TODO:  from statement ?
         value = self.stack.pop()
         self.stack.push(PyYieldFrom(value))
@@ -2423,7 +2537,7 @@ class SuiteDecompiler:
     # For loops
     #
 
-    def GET_ITER(self, addr):
+    def GET_ITER(self, addr, arg=None):
         pass
 
     def FOR_ITER(self, addr: Address, delta):
@@ -2556,14 +2670,14 @@ class SuiteDecompiler:
         self.stack.push(PyFormatString(params))
 
     # Coroutines
-    def GET_AWAITABLE(self, addr: Address):
+    def GET_AWAITABLE(self, addr: Address, arg=None):
         func: AwaitableMixin = self.stack.pop()
         func.is_awaited = True
         self.stack.push(func)
         yield_op = addr.seek_forward(YIELD_FROM)
         return yield_op[1]
 
-    def BEFORE_ASYNC_WITH(self, addr: Address):
+    def BEFORE_ASYNC_WITH(self, addr: Address, arg=None):
         with_addr = addr.seek_forward(SETUP_ASYNC_WITH)
         end_with = with_addr.jump()
         with_stmt = WithStatement(self.stack.pop())
@@ -2586,10 +2700,10 @@ class SuiteDecompiler:
     def SETUP_ASYNC_WITH(self, addr: Address, arg):
         pass
 
-    def GET_AITER(self, addr: Address):
+    def GET_AITER(self, addr: Address, arg=None):
         return addr[2]
 
-    def GET_ANEXT(self, addr: Address):
+    def GET_ANEXT(self, addr: Address, arg=None):
         iterable = self.stack.pop()
         for_stmt = ForStatement(iterable)
         for_stmt.is_async = True
@@ -2613,7 +2727,7 @@ class SuiteDecompiler:
 
 
 def make_dynamic_instr(cls):
-    def method(self, addr):
+    def method(self, addr, arg=None):
         cls.instr(self.stack)
 
     return method
@@ -2644,6 +2758,51 @@ for op, name, ptn, prec, inplace_ptn in binary_ops:
         globals()[tp_name] = tp
         setattr(SuiteDecompiler, inplace_op, make_dynamic_instr(tp))
 
+
+def make_dispatch_table(cls):
+    """
+    Set cls.dispatch to a list of the instruction handlers of cls
+    indexed by opcode, each called as handler(self, addr, arg).  The
+    handlers of opcodes without an argument take an ignored arg=None, so
+    every handler is called directly.  Opcodes without a handler raise an
+    error, so they are skipped and counted by SuiteDecompiler.run().
+    """
+    def make_handler(name):
+        method = getattr(cls, name, None)
+        if method is None:
+            def method(self, addr, arg):
+                raise Exception('Unsupported opcode {}'.format(name))
+        return method
+
+    cls.dispatch = [make_handler(name) for name in opname]
+
+
+def get_swallowed_exceptions():
+    """
+    Return a dict of opcode name: number of times an exception in its
+    handler was swallowed by SuiteDecompiler.run() and the instruction
+    skipped in the calling thread, since the last
+    reset_swallowed_exceptions().
+    """
+    return dict(getattr(swallowed_exceptions, 'counts', ()))
+
+
+def reset_swallowed_exceptions():
+    swallowed_exceptions.counts = Counter()
+
+
+def count_swallowed_exception(name):
+    if not hasattr(swallowed_exceptions, 'counts'):
+        reset_swallowed_exceptions()
+    swallowed_exceptions.counts[name] += 1
+
+
+# Kept per thread, so concurrent decompiles each count their own
+swallowed_exceptions = threading.local()
+
+
+make_dispatch_table(SuiteDecompiler)
+
 if __name__ == "__main__":
     import sys
 
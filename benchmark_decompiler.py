@@ -0,0 +1,261 @@
+# Benchmark for the TS4 Python decompiler front-end (decompiler.py)
+#
+# Byte-compiles a fixed corpus (a pinned set of standard library modules plus generated stress modules),
+# decompiles it with each available decompiler and number of threads and reports files per second,
+# the time spent in each phase and the number of files in each result bucket.  Results can be saved
+# as a baseline and later runs compared against it to see whether a change made things faster or slower.
+#
+# usage: benchmark_decompiler.py [-h] [-b unpyc3|py37dec] [-t N [N ...]] [-n N]
+#                                [-o FILENAME] [--baseline FILENAME] [-w FOLDER]
+#
+# The corpus is only reproducible with the same Python version (3.7.0 for proper results), the
+# source hash of every module is stored with the results and a mismatch is reported when comparing.
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import py_compile
+import shutil
+import sys
+import tempfile
+import time
+
+import decompiler
+
+# Standard library modules in the corpus, relative to the standard library folder
+BENCHMARK_STDLIB_MODULES = [
+    'argparse.py',
+    'ast.py',
+    'calendar.py',
+    'configparser.py',
+    'dataclasses.py',
+    'difflib.py',
+    'dis.py',
+    'enum.py',
+    'functools.py',
+    'inspect.py',
+    'json/decoder.py',
+    'json/encoder.py',
+    'pprint.py',
+    'shlex.py',
+    'string.py',
+    'textwrap.py',
+    'tokenize.py',
+    'typing.py',
+]
+
+# Default number of times each configuration is run, the fastest run is reported
+DEFAULT_REPEAT = 3
+
+# Default folder the corpus is built and decompiled in
+DEFAULT_WORK_FOLDER = os.path.join(tempfile.gettempdir(), 'decompiler_benchmark')
+
+PHASES = ['read', 'unmarshal', 'decompile', 'compile', 'compare', 'merge', 'write']
+BUCKETS = ['perfect', 'good', 'syntax', 'failure', 'timeout']
+
+
+# A single function with thousands of statements, a very large code object
+def make_large_function_module(statements=3000):
+    lines = ['def large_function(a, b, c):', '    total = 0']
+    for i in range(statements):
+        if i % 3 == 0:
+            lines.append('    total += a * {} - b'.format(i))
+        elif i % 3 == 1:
+            lines.append('    c = [x + {} for x in range(b) if x % 7]'.format(i))
+        else:
+            lines.append('    total ^= len(c) + {}'.format(i))
+    lines.append('    return total')
+    return '\n'.join(lines) + '\n'
+
+# Deeply nested conditionals and loops, hard for the control flow analysis
+def make_nested_module(depth=40):
+    lines = ['def nested(values):', '    result = 0']
+    indent = '    '
+    for i in range(depth):
+        if i % 4 == 3:
+            lines.append('{}for v{} in values:'.format(indent, i))
+        elif i % 4 == 1:
+            lines.append('{}if values[{}] > {} or not values:'.format(indent, i % 5, i))
+        else:
+            lines.append('{}if result < {} and values:'.format(indent, i))
+            lines.append('{}    result += {}'.format(indent, i))
+            lines.append('{}elif result > {}:'.format(indent, i * 2))
+            lines.append('{}    result -= 1'.format(indent))
+            lines.append('{}else:'.format(indent))
+        indent += '    '
+        lines.append('{}result += 1'.format(indent))
+    lines.append('    return result')
+    return '\n'.join(lines) + '\n'
+
+# Many small functions and classes, a large number of code objects to hash and compare
+def make_many_functions_module(count=400):
+    lines = []
+    for i in range(count):
+        lines.append('class Class{}:'.format(i))
+        lines.append('    def __init__(self, value={}):'.format(i))
+        lines.append('        self.value = value')
+        lines.append('    @property')
+        lines.append('    def doubled(self):')
+        lines.append('        return self.value * 2')
+        lines.append('def function_{}(x, *args, key=None, **kwargs):'.format(i))
+        lines.append('    try:')
+        lines.append('        return x.get(key, {}) if key else sum(args)'.format(i))
+        lines.append('    except (KeyError, TypeError) as ex:')
+        lines.append('        raise ValueError(str(ex)) from ex')
+        lines.append('    finally:')
+        lines.append('        kwargs.clear()')
+    return '\n'.join(lines) + '\n'
+
+# Long boolean expressions, comprehensions, lambdas and f-strings
+def make_expressions_module(count=300):
+    lines = ['def expressions(a, b, c, items):', '    results = []']
+    for i in range(count):
+        if i % 4 == 0:
+            lines.append('    results.append(a and b or c and not a or (b if c > {} else a))'.format(i))
+        elif i % 4 == 1:
+            lines.append('    results.append({{k: v for k, v in items if k != {} and (v or k)}})'.format(i))
+        elif i % 4 == 2:
+            lines.append('    results.append(sorted(items, key=lambda item: (item[0] % {} , -item[1])))'.format(i + 1))
+        else:
+            lines.append("    results.append(f'{{a!r}} {{b:>{}}} {{c}}')".format(i % 20 + 1))
+    lines.append('    return results')
+    return '\n'.join(lines) + '\n'
+
+SYNTHETIC_MODULES = {
+    'stress_large_function.py': make_large_function_module,
+    'stress_nested.py': make_nested_module,
+    'stress_many_functions.py': make_many_functions_module,
+    'stress_expressions.py': make_expressions_module,
+}
+
+
+# Write the sources of the corpus to work_folder/source and byte-compile them into work_folder/compiled.
+# Returns the folder of compiled files and the source hash of every module.
+def build_corpus(work_folder):
+    source_folder = os.path.join(work_folder, 'source')
+    compiled_folder = os.path.join(work_folder, 'compiled')
+    shutil.rmtree(work_folder, ignore_errors=True)
+    stdlib_folder = os.path.dirname(os.__file__)
+    sources = {}
+    for module in BENCHMARK_STDLIB_MODULES:
+        with open(os.path.join(stdlib_folder, module), 'r', encoding='UTF-8') as fp:
+            sources['stdlib/' + module] = fp.read()
+    for module, make_module in SYNTHETIC_MODULES.items():
+        sources['synthetic/' + module] = make_module()
+
+    corpus = {}
+    for module, source in sorted(sources.items()):
+        source_filename = os.path.join(source_folder, module)
+        os.makedirs(os.path.dirname(source_filename), exist_ok=True)
+        with open(source_filename, 'w', encoding='UTF-8') as fp:
+            fp.write(source)
+        compiled_filename = os.path.join(compiled_folder, os.path.splitext(module)[0] + '.pyc')
+        py_compile.compile(source_filename, cfile=compiled_filename, doraise=True)
+        corpus[module] = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+    return compiled_folder, corpus
+
+# Decompile the corpus once in the given decompile session.  Every run writes to a fresh destination
+# folder, so no cache, manifest or timing history carries over between runs.
+def run_once(compiled_folder, work_folder, session):
+    dest_folder = os.path.join(work_folder, 'decompiled')
+    shutil.rmtree(dest_folder, ignore_errors=True)
+    results_log_file = os.path.join(work_folder, 'results.jsonl')
+    start_time = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        session.run(compiled_folder, dest_folder, results_log_file=results_log_file)
+    elapsed_time = time.perf_counter() - start_time
+
+    phase_times = {phase: 0.0 for phase in PHASES}
+    buckets = {bucket: 0 for bucket in BUCKETS}
+    files = 0
+    with open(results_log_file, 'r', encoding='UTF-8') as fp:
+        for line in fp:
+            record = json.loads(line)
+            files += 1
+            buckets[BUCKETS[record['result']]] += 1
+            for phase, phase_time in record['phase_times'].items():
+                phase_times[phase] += phase_time
+    return {
+        'files': files,
+        'seconds': elapsed_time,
+        'files_per_second': files / elapsed_time if elapsed_time else 0,
+        'phase_times': phase_times,
+        'buckets': buckets,
+    }
+
+# Run every configuration, keeping the fastest of the repeated runs of each
+def run_benchmark(backends, thread_counts, repeat, work_folder):
+    compiled_folder, corpus = build_corpus(work_folder)
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'corpus': corpus,
+        'runs': {},
+    }
+    for backend in backends:
+        for threads in thread_counts:
+            name = '{}/{}'.format(backend, threads)
+            print('Running {} ({} threads)'.format(backend, threads))
+            # The repeated runs share the session, so its pool is only started once
+            with decompiler.DecompileSession(backend, threads) as session:
+                runs = [run_once(compiled_folder, work_folder, session) for i in range(repeat)]
+            results['runs'][name] = min(runs, key=lambda run: run['seconds'])
+    return results
+
+def print_results(results):
+    print('\nPython {} on {}, {} files'.format(results['python'], results['platform'], len(results['corpus'])))
+    print('\n{:16}{:>10}{:>10}'.format('run', 'files/s', 'seconds') + ''.join('{:>11}'.format(phase) for phase in PHASES) + ''.join('{:>9}'.format(bucket) for bucket in BUCKETS))
+    for name, run in results['runs'].items():
+        print('{:16}{:10.2f}{:10.2f}'.format(name, run['files_per_second'], run['seconds']) + ''.join('{:11.3f}'.format(run['phase_times'][phase]) for phase in PHASES) + ''.join('{:9}'.format(run['buckets'][bucket]) for bucket in BUCKETS))
+
+# Print the change of every run against the same run in the baseline
+def compare_results(results, baseline):
+    print('\nCompared to baseline from {} (Python {})'.format(baseline['created'], baseline['python']))
+    if results['corpus'] != baseline['corpus']:
+        changed = sorted(module for module in set(results['corpus']) | set(baseline['corpus']) if results['corpus'].get(module) != baseline['corpus'].get(module))
+        print('Warning, the corpus differs from the baseline: {}'.format(', '.join(changed)))
+    for name, run in results['runs'].items():
+        baseline_run = baseline['runs'].get(name)
+        if not baseline_run:
+            print('{:16}not in baseline'.format(name))
+            continue
+        changes = ['files/s {:+.1f}%'.format((run['files_per_second'] / baseline_run['files_per_second'] - 1) * 100 if baseline_run['files_per_second'] else 0)]
+        for phase in PHASES:
+            delta = run['phase_times'][phase] - baseline_run['phase_times'][phase]
+            if abs(delta) >= 0.001:
+                changes.append('{} {:+.3f}s'.format(phase, delta))
+        for bucket in BUCKETS:
+            delta = run['buckets'][bucket] - baseline_run['buckets'][bucket]
+            if delta:
+                changes.append('{} {:+d}'.format(bucket, delta))
+        print('{:16}{}'.format(name, ', '.join(changes)))
+
+
+if __name__ == '__main__':
+    if sys.version_info[0] != 3 or sys.version_info[1] != 7 or sys.version_info[2] != 0:
+        print('Warning, decompiler requires Python version 3.7.0 for proper results')
+
+    available_backends = [backend for backend, available in [('unpyc3', decompiler.UNPYC3_AVAILABLE), ('py37dec', decompiler.PY37DEC_AVAILABLE)] if available]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-b', nargs='+', metavar='unpyc3|py37dec', choices=['unpyc3', 'py37dec'], default=available_backends, dest='backends', help='decompilers to benchmark (default all available)')
+    parser.add_argument('-t', nargs='+', type=int, metavar='N', default=[1, os.cpu_count() or 1], dest='thread_counts', help='numbers of decompile threads to benchmark (default 1 and the number of CPUs)')
+    parser.add_argument('-n', nargs=1, type=int, metavar='N', default=[DEFAULT_REPEAT], dest='repeat', help='run each configuration N times and keep the fastest (default 3)')
+    parser.add_argument('-o', nargs=1, metavar='FILENAME', default=[None], dest='output_file', help='save the results as JSON, for use as a baseline')
+    parser.add_argument('--baseline', nargs=1, metavar='FILENAME', default=[None], dest='baseline_file', help='compare the results against a saved baseline')
+    parser.add_argument('-w', nargs=1, metavar='FOLDER', default=[DEFAULT_WORK_FOLDER], dest='work_folder', help='folder to build and decompile the corpus in')
+    args = parser.parse_args()
+    if not args.backends:
+        print('No decompiler is available, please install unpyc3 or py37dec')
+        exit()
+
+    results = run_benchmark(args.backends, sorted(set(args.thread_counts)), args.repeat[0], args.work_folder[0])
+    print_results(results)
+    if args.baseline_file[0]:
+        with open(args.baseline_file[0], 'r', encoding='UTF-8') as fp:
+            compare_results(results, json.load(fp))
+    if args.output_file[0]:
+        with open(args.output_file[0], 'w', encoding='UTF-8') as fp:
+            json.dump(results, fp, indent=2)
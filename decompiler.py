@@ -36,6 +36,35 @@ DEFAULT_MAX_THREADS = 1
 # Set to either 'unpyc3' or 'py37dec'
 DEFAULT_DECOMPILER = compiler_name
 
+# Default folder for the decompile results cache (--cache)
+DEFAULT_CACHE_FOLDER = './decompile_cache'
+
+# Timings of each module are recorded in this file in the destination folder, to estimate the cost
+# of each module in the next run
+TIMINGS_FILENAME = '.decompile_timings.json'
+
+# Journal of the files completed by a run in the destination folder, removed once the run finishes (--resume)
+JOURNAL_FILENAME = '.decompile_journal.jsonl'
+
+# Seconds between syncing the journal to disk.  Every entry reaches the OS as it is written, which is enough
+# to resume after the run is killed, syncing only matters if the whole system goes down.
+JOURNAL_SYNC_INTERVAL = 2
+
+# Default SQLite database the results of every run are recorded in (--db)
+DEFAULT_DATABASE_FILE = './decompile_runs.db'
+
+# Default time limit in seconds for diffing the large code objects of one file (--compare-budget)
+DEFAULT_COMPARE_BUDGET = 30
+
+# Adaptive py37dec timeouts (-A): each file's timeout is its expected py37dec time, estimated from its
+# size and the times recorded by previous runs, multiplied by ADAPTIVE_TIMEOUT_FACTOR and kept between
+# ADAPTIVE_TIMEOUT_MIN and the maximum timeout (--max-timeout).  Files that still time out are retried
+# once at the end of the run with their timeout multiplied by ADAPTIVE_TIMEOUT_ESCALATION.
+ADAPTIVE_TIMEOUT_FACTOR = 4
+ADAPTIVE_TIMEOUT_MIN = 2
+ADAPTIVE_TIMEOUT_ESCALATION = 4
+DEFAULT_MAX_TIMEOUT = 120
+
 """      Command line help:
 
 decompiler.py - For decompiling The Sims 4 Python modules
@@ -48,6 +77,10 @@ Requires:
 usage: decompiler.py [-h] [-z ZIP_FOLDER] [-s SOURCE_FOLDER] [-d DEST_FOLDER]
                      [-S] [-p] [-t N] [-r [FILENAME]] [-L [N]]
                      [-c none|detail] [-U] [-P] [-T SEC]
+                     [--cache [CACHE_FOLDER]] [--cache-size MB] [-I] [-x]
+                     [--compare-budget SEC] [-A] [--max-timeout SEC]
+                     [-l [FILENAME]] [--max-memory MB] [--max-tasks N] [-R] [-F]
+                     [--db [DATABASE]] [--resume]
 
 optional arguments:
   -h, --help        show this help message and exit
@@ -58,11 +91,31 @@ optional arguments:
   -p                prefix output filenames with [RESULT]
   -t N              number of simultaneous decompile threads to use
   -r [FILENAME]     create CSV file containing results for decompiled files
-  -L [N]            code objects with >N bytes will not be analyzed
+  -l [FILENAME]     log the results and phase timings of each file to a JSON lines file as it completes
+  --db [DATABASE]   record the run and the results of every file in a SQLite database (default ./decompile_runs.db),
+                    query it with Utilities/run_database.py
+  -L [N]            code objects with >N bytes are compared with a faster, less detailed diff
   -c none|detail    prefix decompiled files with test results comment (default brief)
   -U                use unpyc3 for decompilation
   -P                use py37dec for decompilation
   -T SEC            py37dec only: override timeout in seconds (0=no limit, default 5)
+  --cache [CACHE_FOLDER]
+                    reuse results for unchanged .pyc files from CACHE_FOLDER (default ./decompile_cache)
+  --cache-size MB   maximum size of the decompile cache in megabytes (default 1024)
+  -I                only extract and decompile Zip entries changed since the last run
+  -x                extract the Zip files to DEST_FOLDER in parallel, decompiling each file as soon as it is extracted
+                    (by default .pyc files are read straight from the Zip files)
+  --compare-budget SEC
+                    time limit for diffing the large code objects of one file (0=no limit, default 30)
+  -R                race unpyc3 and py37dec on every file and keep the better result
+  -F                re-decompile only the functions that differ from the original with the other
+                    decompiler, and merge them into the file
+  -A                py37dec only: adapt the timeout of each file to its size and recorded decompile
+                    times, and retry files that time out once at the end with a longer timeout
+  --max-timeout SEC py37dec only: upper limit for adaptive timeouts (default 120)
+  --max-memory MB   stop decompiling a file once it uses more than MB megabytes of memory (0=no limit, default 0)
+  --max-tasks N     replace each decompile thread with a fresh process after N files (0=never, default 0)
+  --resume          continue an interrupted run into the same DEST_FOLDER, skipping the files it completed
 """
 
 
@@ -76,13 +129,28 @@ import dis
 import marshal
 import types
 import inspect
+import hashlib
 import difflib
-import re
+import io
+import tokenize
+import bisect
+import functools
+import json
+import math
 import multiprocessing
 import sys
 import argparse
 import shutil
 import zipfile
+import posixpath
+import queue
+import tempfile
+import threading
+from Utilities import decompile_cache
+from Utilities import memory_monitor
+from Utilities import parallel_unzip
+from Utilities import run_database
+from Utilities import timing_history
 
 if DEFAULT_DECOMPILER != 'py37dec' and DEFAULT_DECOMPILER != 'unpyc3':
     print('Invalid setting for DEFAULT_DECOMPILER in source')
@@ -100,16 +168,29 @@ try:
     import unpyc3
     UNPYC3_AVAILABLE = True
 except:
-    pass
+    # Fall back to the copy of unpyc3 that ships in Utilities
+    try:
+        from Utilities import unpyc3
+        UNPYC3_AVAILABLE = True
+    except:
+        pass
 
 # Quick 'n' dirty stopwatch timer
 class Timer():
     def __init__(self):
         self.start_time = time.perf_counter()
+        self.lap_start_time = self.start_time
 
     def elapsed_time(self):
         return time.perf_counter() - self.start_time
 
+    # Returns the time since the previous lap (or the start) and starts the next lap
+    def lap(self):
+        lap_time = time.perf_counter()
+        elapsed = lap_time - self.lap_start_time
+        self.lap_start_time = lap_time
+        return elapsed
+
 # Values returned from a "thread" to indicate results.  Since the Python VM doesn't really
 # support true threads and shared data, the results are encapsulated in this and the Python
 # "threading" library returns this information to the main thread via an OS dependent mechanism.
@@ -120,45 +201,298 @@ class DecompileResultData():
         self.decompile_time = -1
         self.analyze_time = -1
         self.result = -1
+        self.cached = False
+        self.decompiler = None
+        # Structural hash of the module code object and of every function in it, keyed by qualified
+        # name, plus the qualified names of the functions that differ in the decompiled source
+        self.code_hash = ''
+        self.function_hashes = {}
+        self.mismatched_functions = []
+        # Path of the module relative to the source folder, size of the .pyc and the estimated
+        # and actual time in seconds taken by its decompile job
+        self.module = ''
+        self.size = 0
+        self.estimated_cost = -1
+        self.actual_cost = -1
+        # Time in seconds py37dec ran on the file (-1 if it was not used) and the timeout it was given.
+        # deferred is set when py37dec timed out and the file is to be retried at the end of the run.
+        self.py37dec_time = -1
+        self.py37dec_timeout = None
+        self.deferred = False
+        # Time in seconds spent in each phase of the job: read, unmarshal (including hashing the code
+        # objects), decompile, compile, compare, merge (-F) and write.  Phases that did not run are missing.
+        self.phase_times = {}
+        # Size of the written .py file and the process id of the "thread" that did the work
+        self.py_size = 0
+        self.worker = 0
+        # Peak resident memory in bytes used to decompile the file (0 if unknown), and whether the
+        # decompile was stopped for exceeding the memory limit
+        self.peak_rss = 0
+        self.memory_exceeded = False
+        # Set when the decompile was cancelled because the other decompiler won the race (-R)
+        self.cancelled = False
+        # Qualified names of the functions whose bodies were taken from the other decompiler (-F)
+        self.merged_functions = []
+        # Number of instructions unpyc3 skipped because their handler failed, keyed by opcode name
+        self.skipped_instructions = {}
+        # Set when decompiling in place, the .pyc is removed once the result has been journaled
+        self.remove_pyc = False
+
+    # Returns the result as a JSON serializable dictionary, for the results log and journal
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    # Returns the result from a dictionary returned by to_dict()
+    @classmethod
+    def from_dict(cls, fields):
+        result = cls(fields['pycFilename'])
+        result.__dict__.update(fields)
+        return result
+
+    # Result fields stored by the decompile cache, everything else depends on where the file is written
+    CACHED_FIELDS = ['result', 'decompile_time', 'analyze_time', 'code_hash', 'function_hashes', 'mismatched_functions', 'merged_functions', 'skipped_instructions']
 
 # Reads the code object from a compiled Python (.pyc) file
 def get_codeobj_from_pyc(filename):
     with open(filename, 'rb') as fp:
-        code_obj = marshal.loads(fp.read()[16:])
+        code_obj = get_codeobj_from_pyc_data(fp.read())
     return code_obj
 
+# Reads the code object from the contents of a compiled Python (.pyc) file
+def get_codeobj_from_pyc_data(pyc_data):
+    return marshal.loads(pyc_data[16:])
+
+# Reads the contents of a compiled Python (.pyc) file from one of the game Zip files.  Each process
+# keeps its own ZipFile handles, as a handle inherited over fork() shares its file position.
+_zip_files = {}
+
+def read_zip_member(zip_filename, member):
+    zip = _zip_files.get(zip_filename)
+    if zip is None or zip[0] != os.getpid():
+        zip = (os.getpid(), zipfile.ZipFile(zip_filename))
+        _zip_files[zip_filename] = zip
+    return zip[1].read(member)
+
 # Code object comparison routines based on code written by Andrew from Sims 4 Studio
 #
 # Handle formatting dis() output of a code object in order to run through a diff process.
-code_obj_regex = re.compile(r'(.*)\(\<code object (.*) at 0x.*, file "(.*)", line (.*)>\)', re.RegexFlag.IGNORECASE)
+# The lines are built from the instructions already decoded for the comparison, in the format of the
+# dis() lines with their line numbers removed and nested code objects reduced to their names.
+def format_dis_lines(co, instructions):
+    # dis() widens the offset column for code of 10000 bytes or more
+    offset_width = max(len(str(len(co.co_code) - 2)), 4)
+    lines = []
+    for instruction in instructions:
+        if instruction.is_jump_target:
+            line = '>> {} '.format(repr(instruction.offset).rjust(offset_width))
+        else:
+            line = '{} '.format(instruction.offset)
+        line += instruction.opname.ljust(20)
+        if instruction.arg is not None:
+            line += ' ' + repr(instruction.arg).rjust(5)
+            if type(instruction.argval) is types.CodeType:
+                # strip out any line numbers, filenames, or offsets
+                line += ' ' + normalize_const(instruction.argval)
+            elif instruction.argrepr:
+                line += ' (' + instruction.argrepr + ')'
+        lines.append(line.rstrip())
+    return lines
+
+# Returns a comparable key for a constant.  Code objects are reduced to their name, as they are compared
+# separately and their addresses and line numbers never match.  Other constants are keyed by their repr(),
+# so 1, 1.0 and True are different constants just like they are in the dis() output.
+def normalize_const(const):
+    if type(const) is types.CodeType:
+        return '<{}>'.format(const.co_name)
+    return repr(const)
+
+# Opcodes whose resolved argument is the offset of the instruction they jump to
+JUMP_OPCODES = frozenset(dis.hasjrel + dis.hasjabs)
 
-def format_dis_lines(co):
+# Returns the instructions of a code object, decoded by dis.get_instructions(), as (opcode, resolved argument)
+# tuples without offsets or line numbers, so two code objects can be compared directly without rendering
+# and diffing dis() text.  Jump targets are kept relative to the jump, which is just as exact since every
+# instruction is 2 bytes, but lets the keys after an inserted instruction still match in anchored_diff().
+def get_normalized_instructions(instructions):
+    normalized = []
+    for instruction in instructions:
+        if instruction.opcode in JUMP_OPCODES:
+            normalized.append((instruction.opcode, instruction.argval - instruction.offset))
+        else:
+            normalized.append((instruction.opcode, normalize_const(instruction.argval)))
+    return normalized
+
+# Quick check for identical instruction streams.  The arguments of every instruction index into these
+# tables, so when the raw bytecode and all of the tables match, so do the normalized instructions.
+def has_identical_instructions(pyc_co, py_co):
+    return (pyc_co.co_code == py_co.co_code
+            and pyc_co.co_names == py_co.co_names
+            and pyc_co.co_varnames == py_co.co_varnames
+            and pyc_co.co_cellvars == py_co.co_cellvars
+            and pyc_co.co_freevars == py_co.co_freevars
+            and list(map(normalize_const, pyc_co.co_consts)) == list(map(normalize_const, py_co.co_consts)))
+
+# Returns a structural hash of a code object, covering everything compare_codeobjs() checks (flags,
+# argument counts, names, constants, local and cell variable names and bytecode) but not filenames or
+# line numbers.  Nested code objects contribute their own hash, computed bottom-up, so two code objects
+# with the same hash have identical subtrees.  Hashes are memoized in code_hashes, keyed by id().
+def get_code_hash(co, code_hashes) -> str:
+    entry = code_hashes.get(id(co))
+    if entry is None:
+        consts = [get_code_hash(const, code_hashes) if type(const) is types.CodeType else normalize_const(const) for const in co.co_consts]
+        fields = (co.co_name, co.co_flags, co.co_argcount, co.co_kwonlyargcount, co.co_nlocals, co.co_names, co.co_varnames, co.co_cellvars, co.co_freevars, consts)
+        digest = hashlib.sha1(co.co_code)
+        digest.update(repr(fields).encode('utf-8'))
+        # Keep a reference to the code object, so its id() cannot be reused while the hash is memoized
+        entry = (co, digest.hexdigest())
+        code_hashes[id(co)] = entry
+    return entry[1]
+
+# Returns the nested code objects of a code object as (qualified name, code object) pairs, qualified
+# names join the co_name of each parent with '.' and repeated names are numbered, e.g. '<lambda>#2'.
+def get_nested_codeobjs(co, prefix=''):
+    nested = []
+    names = {}
+    for const in co.co_consts:
+        if type(const) is types.CodeType:
+            names[const.co_name] = names.get(const.co_name, 0) + 1
+            name = const.co_name if names[const.co_name] == 1 else '{}#{}'.format(const.co_name, names[const.co_name])
+            nested.append((prefix + name, const))
+    return nested
+
+# Returns the structural hash of every code object in a module, keyed by qualified name
+def get_function_hashes(co, code_hashes, name='<module>'):
+    function_hashes = {name: get_code_hash(co, code_hashes)}
+    for nested_name, nested_co in get_nested_codeobjs(co, name + '.'):
+        function_hashes.update(get_function_hashes(nested_co, code_hashes, nested_name))
+    return function_hashes
 
-    def remove_line_number(s: str):
-        ix = s.index(' ', 5)
-        x = s[ix:].lstrip(' ')
-        return x
+# Returns the qualified names of the code objects that differ between the two code objects.  Identical
+# subtrees are skipped by hash, only the innermost differing code objects of a subtree are listed.
+def get_mismatched_functions(pyc_co, py_co, code_hashes, name='<module>'):
+    if get_code_hash(pyc_co, code_hashes) == get_code_hash(py_co, code_hashes):
+        return []
+    mismatched = []
+    py_nested = dict(get_nested_codeobjs(py_co, name + '.'))
+    for nested_name, nested_co in get_nested_codeobjs(pyc_co, name + '.'):
+        if nested_name in py_nested:
+            mismatched += get_mismatched_functions(nested_co, py_nested[nested_name], code_hashes, nested_name)
+        else:
+            mismatched.append(nested_name)
+    if not mismatched:
+        mismatched.append(name)
+    return mismatched
+
+# Returns every code object in a module keyed by qualified name, as named by get_nested_codeobjs()
+def get_codeobjs_by_name(co, name='<module>'):
+    codeobjs = {name: co}
+    for nested_name, nested_co in get_nested_codeobjs(co, name + '.'):
+        codeobjs.update(get_codeobjs_by_name(nested_co, nested_name))
+    return codeobjs
 
-    def clean_code_object_line(s: str):
-        # strip out any line numbers, filenames, or offsets
-        global code_obj_regex
-        b = code_obj_regex.match(s)
-        if b:
-            return s.replace(b.group(0), '{}<{}>'.format(b.group(1), b.group(2)))
-        return s
+# Largest number of instruction pairs in a gap between anchors that anchored_diff() hands to difflib
+ANCHORED_DIFF_MAX_GAP = 250000
 
-    return list(
-               map(clean_code_object_line,
-                   map(remove_line_number,
-                       filter(None,
-                              dis.Bytecode(co).dis().split('\n')))))
+# Diff two lists of keys in near-linear time for very large code objects, where difflib's quadratic
+# worst case is too slow.  Keys that occur exactly once in both lists are used as anchors (the longest
+# increasing sequence of them, as in a patience diff), the gaps between anchors are split the same way
+# and only small gaps are passed to difflib.  Gaps that are still too large, or any gaps left when the
+# deadline (a Timer.perf_counter() value) passes, are reported as replaced as a whole.
+# Returns the changed blocks as (a start, a end, b start, b end) tuples, whether the deadline passed and
+# whether a gap was too large to diff.
+def anchored_diff(a, b, deadline=None):
+    # Compare keys as small integers
+    key_ids = {}
+    a_ids = [key_ids.setdefault(key, len(key_ids)) for key in a]
+    b_ids = [key_ids.setdefault(key, len(key_ids)) for key in b]
+    timed_out = False
+    gap_too_large = False
+    # Matching blocks of (a index, b index, length), found by splitting gaps until they are small
+    matches = []
+    gaps = [(0, len(a), 0, len(b))]
+    while gaps:
+        alo, ahi, blo, bhi = gaps.pop()
+        while alo < ahi and blo < bhi and a_ids[alo] == b_ids[blo]:
+            matches.append((alo, blo, 1))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a_ids[ahi - 1] == b_ids[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi, 1))
+        if alo == ahi or blo == bhi:
+            continue
+        if deadline is not None and time.perf_counter() > deadline:
+            timed_out = True
+            continue
+        counts = {}
+        for i in range(alo, ahi):
+            counts[a_ids[i]] = counts.get(a_ids[i], 0) + 1
+        a_unique = {a_ids[i]: i for i in range(alo, ahi) if counts[a_ids[i]] == 1}
+        b_counts = {}
+        for j in range(blo, bhi):
+            b_counts[b_ids[j]] = b_counts.get(b_ids[j], 0) + 1
+        anchors = [(a_unique[b_ids[j]], j) for j in range(blo, bhi) if b_counts[b_ids[j]] == 1 and b_ids[j] in a_unique]
+        anchors = longest_increasing_anchors(anchors)
+        if anchors:
+            previous_a, previous_b = alo, blo
+            for i, j in anchors:
+                matches.append((i, j, 1))
+                gaps.append((previous_a, i, previous_b, j))
+                previous_a, previous_b = i + 1, j + 1
+            gaps.append((previous_a, ahi, previous_b, bhi))
+        elif (ahi - alo) * (bhi - blo) <= ANCHORED_DIFF_MAX_GAP:
+            matcher = difflib.SequenceMatcher(None, a_ids[alo:ahi], b_ids[blo:bhi], autojunk=False)
+            for i, j, n in matcher.get_matching_blocks():
+                if n:
+                    matches.append((alo + i, blo + j, n))
+        else:
+            gap_too_large = True
+    # Everything between two consecutive matching blocks is a changed block
+    changes = []
+    matches.sort()
+    i = j = 0
+    for match_a, match_b, n in matches + [(len(a), len(b), 0)]:
+        if i < match_a or j < match_b:
+            changes.append((i, match_a, j, match_b))
+        i, j = match_a + n, match_b + n
+    return changes, timed_out, gap_too_large
+
+# Returns the longest subsequence of (a index, b index) anchors, sorted by a index, whose b indexes
+# also increase, in O(n log n).
+def longest_increasing_anchors(anchors):
+    anchors.sort()
+    tails = []
+    tail_indexes = []
+    previous = [-1] * len(anchors)
+    for index, (i, j) in enumerate(anchors):
+        position = bisect.bisect_left(tails, j)
+        if position > 0:
+            previous[index] = tail_indexes[position - 1]
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+    result = []
+    index = tail_indexes[-1] if tail_indexes else -1
+    while index >= 0:
+        result.append(anchors[index])
+        index = previous[index]
+    result.reverse()
+    return result
 
 # Perform the actual code object comparisons
+# Code objects larger than large_codeobjects_threshold bytes are diffed with anchored_diff(), within the
+# time left until deadline, and only the differences are listed for them.
 # Returns a string of errors found, or an empty string for a perfect comparison result
-def compare_codeobjs(pyc_co, py_co, large_codeobjects_threshold):
-    # Large code objects can take a significant time to process with diff(), so skipped by default
-    if large_codeobjects_threshold and len(py_co.co_code) > large_codeobjects_threshold:
-        return '{0}\nSKIPPING COMPARISON OF LARGE CODE OBJECT\n\t{1}\n{0}\n'.format('='*80, pyc_co.co_name)
+def compare_codeobjs(pyc_co, py_co, large_codeobjects_threshold, code_hashes=None, deadline=None):
+    # Identical subtrees have identical hashes and need no further comparison
+    if code_hashes is None:
+        code_hashes = {}
+    if get_code_hash(pyc_co, code_hashes) == get_code_hash(py_co, code_hashes):
+        return ''
     err_str = ''
     flags_err_str = ''
     names_err_str = ''
@@ -203,7 +537,7 @@ def compare_codeobjs(pyc_co, py_co, large_codeobjects_threshold):
                 consts_err_str +=  'Unable to compare constant {}. Does not exist in the decompiled version\n'.format(constant)
             elif type(constant) is types.CodeType:
                 if type(py_co.co_consts[idxc]) is types.CodeType:
-                    err_str += compare_codeobjs(constant, py_co.co_consts[idxc], large_codeobjects_threshold)
+                    err_str += compare_codeobjs(constant, py_co.co_consts[idxc], large_codeobjects_threshold, code_hashes, deadline)
                 else:
                     consts_err_str += 'Constants mismatched: unable to compare code object {} to non-code object {}\n'.format(constant, py_co.co_consts[idxc])
             elif constant != py_co.co_consts[idxc]:
@@ -245,216 +579,387 @@ def compare_codeobjs(pyc_co, py_co, large_codeobjects_threshold):
             err_str += consts_err_str
         if locals_err_str:
             err_str += locals_err_str
-    a = format_dis_lines(pyc_co)
-    b = format_dis_lines(py_co)
+    # Compare the instructions structurally, only rendering the dis() text and diff when they differ.
+    # The instructions are decoded once, for both the comparison and the dis() text.
+    if has_identical_instructions(pyc_co, py_co):
+        return err_str
+    pyc_instructions = list(dis.get_instructions(pyc_co))
+    py_instructions = list(dis.get_instructions(py_co))
+    pyc_keys = get_normalized_instructions(pyc_instructions)
+    py_keys = get_normalized_instructions(py_instructions)
+    if pyc_keys == py_keys:
+        return err_str
+    # Large code objects can take a significant time to process with difflib, so use the anchored diff on
+    # the normalized instructions, which have no offsets, and only render the dis() text of the changes
+    if large_codeobjects_threshold and len(py_co.co_code) > large_codeobjects_threshold:
+        changes, timed_out, gap_too_large = anchored_diff(pyc_keys, py_keys, deadline)
+        d = []
+        for i1, i2, j1, j2 in changes:
+            d.append('@@ -{},{} +{},{} @@'.format(i1 + 1, i2 - i1, j1 + 1, j2 - j1))
+            d += ['-' + line for line in format_dis_lines(pyc_co, pyc_instructions[i1:i2])]
+            d += ['+' + line for line in format_dis_lines(py_co, py_instructions[j1:j2])]
+        if timed_out:
+            d.append('COMPARISON TIME BUDGET EXCEEDED, DIFF IS APPROXIMATE')
+        if gap_too_large:
+            d.append('CHANGED BLOCK TOO LARGE TO DIFF, DIFF IS APPROXIMATE')
+        if any(d):
+            err_str += '{0}\n{1}\n{0}\nLARGE CODE OBJECT DIFF:\n\t{2}\n{0}\n'.format('='*80, pyc_co.co_name, str.join('\n\t', d))
+        return err_str
+    a = format_dis_lines(pyc_co, pyc_instructions)
+    b = format_dis_lines(py_co, py_instructions)
     d = list(difflib.unified_diff(a, b))
     if any(d):
         err_str +=  '{0}\n{1}\n{0}\nEXPECTED:\n\t{2}\n{0}\nACTUAL:\n\t{3}\n{0}\nDIFF:\n\t{4}\n{0}\n'.format('='*80, pyc_co.co_name, str.join('\n\t', a), str.join('\n\t', b), str.join('\n\t', d))
     return err_str
 
-# Decompile a .pyc file producing a .py file
-# Returns a DecompileResultData encapsulation of the result information.
-def decompile(srcFolder, destFolder, subFolder, pycFile, pyFile, prefix_filenames, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, split_result_folders):
-    decompile_results = DecompileResultData(os.path.realpath(os.path.join(srcFolder, subFolder, pycFile)))
+# Filename prefixes (-p) and result subfolders (-S) for each DecompileResultData.result value
+RESULT_PREFIXES = ['[PERFECT] ', '[GOOD] ', '[SYNTAX] ', '[FAILED] ', '[TIMEOUT] ']
+RESULT_FOLDERS = ['perfect', 'good', 'syntax', 'decompile_failure', 'timeout']
+
+# Returns the key of the cached result of decompiling the contents of a .pyc file with the given decompiler and settings
+def get_cache_key(cache, pyc_data, pyFile, large_codeobjects_threshold, comment_style, decompiler, compare_budget, merge_decompiler=None):
+    cache_key = cache.make_key(pyc_data, decompiler, get_decompiler_version(decompiler), pyFile, large_codeobjects_threshold, compare_budget, comment_style)
+    if merge_decompiler:
+        cache_key = cache.make_key(pyc_data, cache_key, merge_decompiler, get_decompiler_version(merge_decompiler))
+    return cache_key
+
+# Returns the DecompileResultData and output cached under cache_key, or None if there is no such entry
+def get_cached_result(cache, cache_key, pycFilename, decompiler):
+    cached = cache.get(cache_key)
+    if not cached:
+        return None
+    fields, output = cached
+    decompile_results = DecompileResultData(pycFilename)
+    decompile_results.decompiler = decompiler
+    for field in DecompileResultData.CACHED_FIELDS:
+        # Entries written before a field was added keep its default
+        if field in fields:
+            setattr(decompile_results, field, fields[field])
+    decompile_results.cached = True
+    return decompile_results, output
+
+# Decompile and verify the contents of a .pyc file without writing anything to the destination folder.
+# pycFullFilename is the .pyc on disk, or None if it only exists in memory.
+# Returns the DecompileResultData and the text of the .py file to write.
+def decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, cache=None, pycFullFilename=None, compare_budget=None, memory_limit=0, cancel_event=None, merge_decompiler=None):
+    # A cache hit provides the exact file contents and result of an earlier decompile of
+    # an identical .pyc, so both the decompile and the comparison can be skipped.
+    cache_key = None
+    cached = None
+    if cache:
+        cache_key = get_cache_key(cache, pyc_data, pyFile, large_codeobjects_threshold, comment_style, decompiler, compare_budget, merge_decompiler)
+        cached = get_cached_result(cache, cache_key, pycFilename, decompiler)
+    if cached:
+        decompile_results, output = cached
+    else:
+        decompile_results = DecompileResultData(pycFilename)
+        decompile_results.decompiler = decompiler
+        output = decompile_to_text(decompile_results, pyc_data, pycFullFilename, pyFile, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, compare_budget, memory_limit, cancel_event, merge_decompiler)
+        # Timeouts depend on machine load rather than the file contents and the memory limit is not part
+        # of the key, so neither is ever cached, nor are cancelled decompiles
+        if cache and decompile_results.result != 4 and not decompile_results.memory_exceeded and not decompile_results.cancelled:
+            cache.put(cache_key, output, {field: getattr(decompile_results, field) for field in DecompileResultData.CACHED_FIELDS})
+    return decompile_results, output
+
+# Create the destination folder for a decompiled .py file and write it, named and placed according to its result
+def write_decompile_output(decompile_results, output, destFolder, subFolder, pyFile, prefix_filenames, split_result_folders):
+    if prefix_filenames:
+        pyFile = RESULT_PREFIXES[decompile_results.result] + pyFile
+    if split_result_folders:
+        pyFolder = os.path.join(destFolder, RESULT_FOLDERS[decompile_results.result], subFolder)
+    else:
+        pyFolder = os.path.join(destFolder, subFolder)
     timer = Timer()
-    remove_pyc = True if srcFolder == destFolder else False
-    pycFullFilename = os.path.join(srcFolder, subFolder, pycFile)
+    os.makedirs(pyFolder, exist_ok=True)
+    decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
+    with open(decompile_results.pyFilename, 'w', encoding='UTF-8') as fp:
+        fp.write(output)
+    decompile_results.py_size = len(output)
+    decompile_results.phase_times['write'] = timer.elapsed_time()
+
+# Returns the qualified name of the top-level function or method containing the given code object, or
+# None if it is not inside one (module or class body code, or a lambda or comprehension outside of a def)
+def get_function_unit(name, codeobjs):
+    parts = name.split('.')
+    for i in range(2, len(parts) + 1):
+        unit = '.'.join(parts[:i])
+        co = codeobjs.get(unit)
+        if co is None:
+            return None
+        if co.co_flags & inspect.CO_NEWLOCALS:
+            return unit if not co.co_name.startswith('<') else None
+    return None
 
+# Decompile the body of a single function code object, returns the source or None on failure.
+# py37dec only reads modules, so it is given a .pyc with the function's code object in place of the
+# module's, using the header of the original .pyc.
+def decompile_function_body(co, decompiler, pyc_header, py37dec_timeout, memory_limit=0):
     try:
         if decompiler == 'unpyc3':
-            # For unpyc3, just call the decompile() method from that module
+            with memory_monitor.get_watchdog().watch(memory_limit):
+                return ''.join(str(line) + '\n' for line in unpyc3.Code(co).get_suite(look_for_docstring=True))
+        with tempfile.NamedTemporaryFile(suffix='.pyc', delete=False) as fp:
+            fp.write(pyc_header + marshal.dumps(co))
+            temp_filename = fp.name
+        try:
+            subprocess_result, peak_rss = memory_monitor.run_with_memory_limit([PY37DEC_LOCATION, temp_filename.replace('\\','/')], py37dec_timeout, memory_limit, encoding='utf-8')
+        finally:
+            os.remove(temp_filename)
+        return subprocess_result.stdout if subprocess_result.returncode == 0 else None
+    except (Exception, memory_monitor.MemoryLimitExceeded, memory_monitor.Cancelled):
+        return None
+
+# Replace the body of the function defined at line lineno of a source with new_body, reindented to match.
+# lineno may be that of a decorator.  Returns the new source, or None if the body is on the same line as
+# the def and so cannot be replaced.
+def replace_function_body(src_code, lineno, new_body):
+    tokens = list(tokenize.generate_tokens(io.StringIO(src_code).readline))
+    index = next(i for i, token in enumerate(tokens) if token.type == tokenize.NAME and token.string == 'def' and token.start[0] >= lineno)
+    # The body starts after the ':' closing the signature, at the INDENT of the block
+    depth = 0
+    for index in range(index, len(tokens)):
+        token = tokens[index]
+        if token.type == tokenize.OP and token.string in '([{':
+            depth += 1
+        elif token.type == tokenize.OP and token.string in ')]}':
+            depth -= 1
+        elif token.type == tokenize.OP and token.string == ':' and depth == 0:
+            break
+    index += 1
+    while tokens[index].type == tokenize.COMMENT:
+        index += 1
+    if tokens[index].type != tokenize.NEWLINE:
+        return None
+    while tokens[index].type != tokenize.INDENT:
+        index += 1
+    indent = tokens[index].string
+    first_line = tokens[index].start[0]
+    # The body ends at the DEDENT back to the level of the def
+    level = 0
+    for token in tokens[index:]:
+        if token.type == tokenize.INDENT:
+            level += 1
+        elif token.type == tokenize.DEDENT:
+            level -= 1
+        if level == 0 or token.type == tokenize.ENDMARKER:
+            end_line = token.start[0]
+            break
+    # Blank lines after the body separate it from the next statement, keep them
+    lines = src_code.splitlines()
+    while end_line - 1 > first_line and not lines[end_line - 2].strip():
+        end_line -= 1
+    body = [indent + line if line.strip() else line for line in new_body.splitlines()]
+    return '\n'.join(lines[:first_line - 1] + body + lines[end_line - 1:]) + '\n'
+
+# Per-function fallback (-F): re-decompile the top-level functions and methods that differ from the
+# original with the alternative decompiler and splice their bodies into the source, one function at a
+# time.  A new body is only kept if the function then matches and nothing else differs as a result.
+# Returns the merged source and the qualified names of the functions that were replaced.
+def merge_function_fallbacks(src_code, pyc_codeobj, py_codeobj, pyFile, code_hashes, decompiler, pyc_header, py37dec_timeout, memory_limit=0):
+    pyc_codeobjs = get_codeobjs_by_name(pyc_codeobj)
+    mismatched_functions = get_mismatched_functions(pyc_codeobj, py_codeobj, code_hashes)
+    units = []
+    for name in mismatched_functions:
+        unit = get_function_unit(name, pyc_codeobjs)
+        if unit and unit not in units:
+            units.append(unit)
+
+    merged_functions = []
+    for unit in units:
+        # Line numbers come from the current source, which changes with every merged function
+        py_unit_codeobj = get_codeobjs_by_name(py_codeobj).get(unit)
+        if py_unit_codeobj is None:
+            continue
+        body = decompile_function_body(pyc_codeobjs[unit], decompiler, pyc_header, py37dec_timeout, memory_limit)
+        if body is None:
+            continue
+        try:
+            merged_code = replace_function_body(src_code, py_unit_codeobj.co_firstlineno, body)
+            if merged_code is None:
+                continue
+            merged_codeobj = compile(merged_code, pyFile, 'exec')
+        except Exception:
+            continue
+        merged_mismatched = get_mismatched_functions(pyc_codeobj, merged_codeobj, code_hashes)
+        if set(merged_mismatched) <= set(mismatched_functions) and not any(name == unit or name.startswith(unit + '.') for name in merged_mismatched):
+            src_code, py_codeobj, mismatched_functions = merged_code, merged_codeobj, merged_mismatched
+            merged_functions.append(unit)
+    return src_code, merged_functions
+
+# Run the decompiler on the contents of a .pyc file and verify the generated source against the original
+# code object.  pycFullFilename is the .pyc on disk, or None if it only exists in memory.
+# Sets the result and times in decompile_results and returns the text of the .py file to write,
+# including the test results comment requested by comment_style (1 = brief, 2 = detailed).
+def decompile_to_text(decompile_results, pyc_data, pycFullFilename, pyFile, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, compare_budget=None, memory_limit=0, cancel_event=None, merge_decompiler=None):
+    timer = Timer()
+    # Get the code object from the .pyc file and the structural hash of every function in it
+    pyc_codeobj = get_codeobj_from_pyc_data(pyc_data)
+    code_hashes = {}
+    decompile_results.function_hashes = get_function_hashes(pyc_codeobj, code_hashes)
+    decompile_results.code_hash = decompile_results.function_hashes['<module>']
+    decompile_results.phase_times['unmarshal'] = timer.lap()
+    try:
+        if decompiler in ('unpyc3', UNPYC3_PARTIAL):
+            # For unpyc3, decompile the module code object in the same way as unpyc3.dec_module().
+            # The watchdog raises MemoryLimitExceeded here if the Suite tree grows past the memory limit.
             src_code = ''
-            lines = unpyc3.decompile(pycFullFilename)
-            for line in lines:
-                src_code += str(line) + '\n'
+            watchdog = memory_monitor.get_watchdog()
+            with watchdog.watch(memory_limit):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise memory_monitor.Cancelled()
+                # An unpyc3 other than the one in Utilities does not count the instructions it skips
+                count_skipped = hasattr(unpyc3, 'get_swallowed_exceptions')
+                if count_skipped:
+                    unpyc3.reset_swallowed_exceptions()
+                code = unpyc3.Code(pyc_codeobj)
+                lines = code.get_suite(include_declarations=False, look_for_docstring=True)
+                for line in lines:
+                    try:
+                        src_code += str(line) + '\n'
+                    except Exception:
+                        # As a fallback, leave out the statements that fail to decompile and keep the rest
+                        if decompiler != UNPYC3_PARTIAL:
+                            raise
+                if count_skipped:
+                    decompile_results.skipped_instructions = unpyc3.get_swallowed_exceptions()
+                decompile_results.peak_rss = watchdog.peak_rss
         else:
             # For py37dec, run the executable in a subprocess.  At least one file from TS4 still takes
-            # too long (and too much virtual memory) to process, so a timeout is specified.
-            subprocess_result = subprocess.run([PY37DEC_LOCATION, pycFullFilename.replace('\\','/')], capture_output=True, encoding='utf-8', timeout=py37dec_timeout)
+            # too long (and too much virtual memory) to process, so a timeout and memory limit are specified.
+            # The executable can only read files, so a .pyc that is only in memory is written to a temporary file.
+            # py37dec decompiles a single file per process and has no batch mode, so it is started for every
+            # file, a long-lived wrapper process would still have to do the same.
+            temp_filename = None
+            if pycFullFilename is None:
+                with tempfile.NamedTemporaryFile(suffix='.pyc', delete=False) as fp:
+                    fp.write(pyc_data)
+                    temp_filename = fp.name
+            try:
+                subprocess_result, decompile_results.peak_rss = memory_monitor.run_with_memory_limit([PY37DEC_LOCATION, (temp_filename or pycFullFilename).replace('\\','/')], py37dec_timeout, memory_limit, encoding='utf-8', cancel_event=cancel_event)
+            finally:
+                if temp_filename:
+                    os.remove(temp_filename)
             decompile_results.decompile_time = timer.elapsed_time()
             if subprocess_result.returncode != 0:
                 # Non-zero return code from the py37dec executable indicates a crash failure
                 # in the executable.  Summarize and build an empty .py file.
-                if prefix_filenames:
-                    pyFile = '[FAILED] ' + pyFile
-                if split_result_folders:
-                    pyFolder = os.path.join(destFolder, 'decompile_failure', subFolder)
-                else:
-                    pyFolder = os.path.join(destFolder, subFolder)
-                os.makedirs(pyFolder, exist_ok=True)
-                decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
-                with open(decompile_results.pyFilename, 'w', encoding='UTF-8') as fp:
-                    if comment_style == 1:
-                        fp.write('# {}: Decompile failed\n'.format(decompiler))
-                    elif comment_style == 2:
-                        fp.write('"""\npy37dec: Decompilation failure\n\n')
-                        fp.write(subprocess_result.stderr)
-                        fp.write('"""\n')
                 decompile_results.result = 3
-                if remove_pyc:
-                    os.remove(pycFullFilename)
-                return decompile_results
+                if comment_style == 1:
+                    return '# {}: Decompile failed\n'.format(decompiler)
+                elif comment_style == 2:
+                    return '"""\npy37dec: Decompilation failure\n\n{}"""\n'.format(subprocess_result.stderr)
+                return ''
             # Rc = 0 from subprocess, so read the source code lines from the subproccess stdout
             src_code = subprocess_result.stdout
+    except memory_monitor.Cancelled:
+        # The other decompiler already won the race (-R), this result is discarded
+        decompile_results.cancelled = True
+        decompile_results.result = 3
+        return ''
+    except memory_monitor.MemoryLimitExceeded as ex:
+        # The decompile was stopped for using too much memory, unpyc3 leaves the peak RSS to the watchdog
+        decompile_results.peak_rss = ex.args[0] if ex.args else memory_monitor.get_watchdog().peak_rss
+        decompile_results.memory_exceeded = True
+        decompile_results.result = 3
+        if comment_style == 1:
+            return '# {}: Memory limit exceeded\n'.format(decompiler)
+        elif comment_style == 2:
+            return '"""\n{}: Memory limit of {} MB exceeded\n"""\n'.format(decompiler, memory_limit // (1024 * 1024))
+        return ''
     except subprocess.TimeoutExpired:
         # This exception will only occur if a py37dec subprocess is killed off due to a timeout.
         decompile_results.decompile_time = timer.elapsed_time()
-        if prefix_filenames:
-            pyFile = '[TIMEOUT] ' + pyFile
-        if split_result_folders:
-            pyFolder = os.path.join(destFolder, 'timeout', subFolder)
-        else:
-            pyFolder = os.path.join(destFolder, subFolder)
-        os.makedirs(pyFolder, exist_ok=True)
-        decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
         decompile_results.result = 4
-        with open(decompile_results.pyFilename, 'w', encoding='UTF-8') as fp:
-            if comment_style == 1:
-                fp.write('# py37dec: Timeout\n')
-            elif comment_style == 2:
-                fp.write('"""\npy37dec: Timeout of {} seconds exceeded\n"""\n'.format(py37dec_timeout))
-        if remove_pyc:
-            os.remove(pycFullFilename)
-        return decompile_results
+        if comment_style == 1:
+            return '# py37dec: Timeout\n'
+        elif comment_style == 2:
+            return '"""\npy37dec: Timeout of {} seconds exceeded\n"""\n'.format(py37dec_timeout)
+        return ''
     except:
         # A normal exception will occur if unpyc3 fails and throws an exception during the
         # decompilation process.
-        if prefix_filenames:
-            pyFile = '[FAILED] ' + pyFile
-        if split_result_folders:
-            pyFolder = os.path.join(destFolder, 'decompile_failure', subFolder)
-        else:
-            pyFolder = os.path.join(destFolder, subFolder)
-        os.makedirs(pyFolder, exist_ok=True)
-        decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
-        with open(decompile_results.pyFilename, 'w', encoding='UTF-8') as fp:
-            if comment_style == 1:
-                fp.write('# {}: Decompile failed\n'.format(decompiler))
-            elif comment_style == 2:
-                fp.write('"""\nunpyc3: Decompilation failure\n\n')
-                fp.write(traceback.format_exc())
-                fp.write('"""\n')
         decompile_results.result = 3
-        if remove_pyc:
-            os.remove(pycFullFilename)
-        return decompile_results
+        if comment_style == 1:
+            return '# {}: Decompile failed\n'.format(decompiler)
+        elif comment_style == 2:
+            return '"""\nunpyc3: Decompilation failure\n\n{}"""\n'.format(traceback.format_exc())
+        return ''
+    finally:
+        decompile_results.phase_times['decompile'] = timer.lap()
 
     decompile_results.decompile_time = timer.elapsed_time()
 
     synErr = None
+    issues = None
     try:
         # Try compiling the generated source, a syntax error in the source code
         # will throw an exception.
         py_codeobj = compile(src_code, pyFile, 'exec')
+        decompile_results.phase_times['compile'] = timer.lap()
 
-        # Get the code object from the .pyc file
-        pyc_codeobj = get_codeobj_from_pyc(decompile_results.pycFilename)
-        
         # Compare the code objects recursively
-        issues = compare_codeobjs(pyc_codeobj, py_codeobj, large_codeobjects_threshold)
+        deadline = time.perf_counter() + compare_budget if compare_budget else None
+        issues = compare_codeobjs(pyc_codeobj, py_codeobj, large_codeobjects_threshold, code_hashes, deadline)
+        decompile_results.mismatched_functions = get_mismatched_functions(pyc_codeobj, py_codeobj, code_hashes)
+        decompile_results.phase_times['compare'] = timer.lap()
+
+        if issues and merge_decompiler:
+            # Take the functions that differ from the other decompiler, then verify the merged source as a whole
+            src_code, decompile_results.merged_functions = merge_function_fallbacks(src_code, pyc_codeobj, py_codeobj, pyFile, code_hashes, merge_decompiler, pyc_data[:16], py37dec_timeout, memory_limit)
+            if decompile_results.merged_functions:
+                py_codeobj = compile(src_code, pyFile, 'exec')
+                issues = compare_codeobjs(pyc_codeobj, py_codeobj, large_codeobjects_threshold, code_hashes, deadline)
+                decompile_results.mismatched_functions = get_mismatched_functions(pyc_codeobj, py_codeobj, code_hashes)
+            decompile_results.phase_times['merge'] = timer.lap()
         decompile_results.analyze_time = timer.elapsed_time() - decompile_results.decompile_time
 
         if not issues:
             # There were no issues returned from the code object comparison, so this code
             # is identical to the original sources.
-            if prefix_filenames:
-                pyFile = '[PERFECT] ' + pyFile
-            if split_result_folders:
-                pyFolder = os.path.join(destFolder, 'perfect', subFolder)
-            else:
-                pyFolder = os.path.join(destFolder, subFolder)
-            decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
             decompile_results.result = 0
         else:
             # There were comparison issues with the code objects, this source code differs
             # from the original.  It may function identically or improperly (or not at all) but
             # only human inspection of the resulting code can determine how good the results are.
-            if prefix_filenames:
-                pyFile = '[GOOD] ' + pyFile
-            if split_result_folders:
-                pyFolder = os.path.join(destFolder, 'good', subFolder)
-            else:
-                pyFolder = os.path.join(destFolder, subFolder)
-            decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
             decompile_results.result = 1
     except:
         # An exception from the compile or comparison will end up here, this is generally
         # due to a syntax error in the decompilation results.
-        if prefix_filenames:
-            pyFile = '[SYNTAX] ' + pyFile
-        if split_result_folders:
-            pyFolder = os.path.join(destFolder, 'syntax', subFolder)
-        else:
-            pyFolder = os.path.join(destFolder, subFolder)
-        decompile_results.pyFilename = os.path.realpath(os.path.join(pyFolder, pyFile))
         decompile_results.result = 2
         synErr = traceback.format_exc(1)
-    # Create the destination folder for this .py file and write it, adding comments
-    # if requested (1 = brief, 2 = detailed).
-    os.makedirs(pyFolder, exist_ok=True)
-    with open(decompile_results.pyFilename, 'w', encoding='UTF-8') as fp:
-        if comment_style == 1:
-            if synErr:
-                fp.write('# {}: Syntax error in decompiled file\n'.format(decompiler))
-            elif issues:
-                fp.write('# {}: Decompiled file contains inaccuracies\n'.format(decompiler))
-            else:
-                fp.write('# {}: 100% Accurate decompile result\n'.format(decompiler))
-        elif comment_style == 2:
-            if synErr:
-                fp.write('"""\n{}:\n{}"""\n'.format(decompiler, synErr))
-            elif issues:
-                fp.write('"""\n{}:\n{}"""\n'.format(decompiler, issues))
-            else:
-                fp.write('# {}: 100% Accurate decompile result\n'.format(decompiler))
-        fp.write(src_code)
+        decompile_results.phase_times['compare' if 'compile' in decompile_results.phase_times else 'compile'] = timer.lap()
 
-    if remove_pyc:
-        os.remove(pycFullFilename)
-    return decompile_results
+    # Add comments to the source if requested (1 = brief, 2 = detailed).
+    header = ''
+    if comment_style == 1:
+        if synErr:
+            header = '# {}: Syntax error in decompiled file\n'.format(decompiler)
+        elif issues:
+            header = '# {}: Decompiled file contains inaccuracies\n'.format(decompiler)
+        else:
+            header = '# {}: 100% Accurate decompile result\n'.format(decompiler)
+    elif comment_style == 2:
+        if decompile_results.merged_functions:
+            header = '# {}: Functions decompiled by {}: {}\n'.format(decompiler, merge_decompiler, ', '.join(decompile_results.merged_functions))
+        if decompile_results.skipped_instructions:
+            header += '# {}: Skipped instructions: {}\n'.format(decompiler, ', '.join('{} x{}'.format(name, count) for name, count in sorted(decompile_results.skipped_instructions.items())))
+        if synErr:
+            header += '"""\n{}:\n{}"""\n'.format(decompiler, synErr)
+        elif issues:
+            header += '"""\n{}:\n{}"""\n'.format(decompiler, issues)
+        else:
+            header += '# {}: 100% Accurate decompile result\n'.format(decompiler)
+    return header + src_code
+
+# Identifies the build of a decompiler, so cached results from an older unpyc3 or py37dec are not reused
+def get_decompiler_version(decompiler):
+    if decompiler in ('unpyc3', UNPYC3_PARTIAL):
+        return decompile_cache.file_version(unpyc3.__file__)
+    return decompile_cache.file_version(PY37DEC_LOCATION)
 
 #
 # The following all runs in the main "thread"
 #
-# Result buckets and counters for the DecompileResultData from each thread
-perfect = []
-good = []
-syntax = []
-failed = []
-timeout = []
-completed = 0
-total = 0
-
-# A completed thread will issue this callback in the main thread, place the
-# DecompileResultData into a bucket depending on the returned result.
-def completed_callback(result) -> bool:
-    global completed, total
-    completed += 1
-
-    # Write percentage complete to stdout
-    #sys.stdout.write('\b\b\b\b{:3}%'.format(int(completed/total*100)))
-    #sys.stdout.flush()
-    
-    if result.result == 0:
-        perfect.append(result)
-        return True
-    elif result.result == 1:
-        good.append(result)
-        return True
-    elif result.result == 2:
-        print('syntax')
-        syntax.append(result)
-        return False
-    elif result.result == 3:
-        print('failed')
-        failed.append(result)
-        return False
-    else:
-        print('timeout')
-        timeout.append(result)
-        return False
-
-
 def is_success(result) -> bool:
     if result.result == 0:
         return True
@@ -467,100 +972,629 @@ def is_success(result) -> bool:
     else:
         return False
 
-# Unzips the script files (.pyc) from the TS4 game executable folders into the destination folder.
-def unzip_script_files(zip_folder, dest_folder):
-    print('Extracting Zip files from game, please wait.')
-    for file in ['base.zip', 'core.zip', 'simulation.zip']:
-        zip = zipfile.ZipFile(os.path.join(zip_folder, file))
-        zip.extractall(os.path.join(dest_folder, os.path.splitext(file)[0]))
+# Returns the (zip filename, destination subfolder) of each of the game's script archives
+def get_script_zip_files(zip_folder):
+    zip_files = [(os.path.join(zip_folder, file), os.path.splitext(file)[0]) for file in ['base.zip', 'core.zip', 'simulation.zip']]
     if os.name == 'posix':
         # Mac location for generated.zip
         generated_folder = os.path.realpath(os.path.join(zip_folder, '../../../Python'))
     else:
         # Windows location for generated.zip
         generated_folder = os.path.realpath(os.path.join(zip_folder, '../../../Game/Bin/Python'))
-    zip = zipfile.ZipFile(os.path.join(generated_folder, 'generated.zip'))
-    zip.extractall(os.path.join(dest_folder, 'generated'))
+    zip_files.append((os.path.join(generated_folder, 'generated.zip'), 'generated'))
+    return zip_files
+
+# The manifest records the CRC and size of every extracted zip entry, keyed by destination subfolder
+# and then by entry name, so the next incremental (-I) run can tell which modules changed.
+MANIFEST_FILENAME = '.decompile_manifest.json'
+
+def load_manifest(dest_folder):
+    try:
+        with open(os.path.join(dest_folder, MANIFEST_FILENAME), 'r', encoding='UTF-8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(dest_folder, manifest):
+    os.makedirs(dest_folder, exist_ok=True)
+    with open(os.path.join(dest_folder, MANIFEST_FILENAME), 'w', encoding='UTF-8') as fp:
+        json.dump(manifest, fp)
+
+# Returns the results in the journal of an interrupted run in dest_folder, keyed by module.  A module
+# journaled more than once, because a resumed run redid it, gets its last result.
+def load_journal(dest_folder):
+    results = {}
+    try:
+        with open(os.path.join(dest_folder, JOURNAL_FILENAME), 'r', encoding='UTF-8') as fp:
+            for line in fp:
+                try:
+                    result = DecompileResultData.from_dict(json.loads(line))
+                except (ValueError, KeyError):
+                    # The last line is incomplete if the run was killed while writing it
+                    continue
+                results[result.module] = result
+    except OSError:
+        pass
+    return results
+
+# Delete every .py file a previous run may have written for a compiled module, whichever result
+# subfolder (-S) or filename prefix (-p) it was written with.
+def remove_decompiled_outputs(dest_folder, subFolder, pycName):
+    pyFolder, pycFile = os.path.split(os.path.join(subFolder, pycName))
+    pyFile = os.path.splitext(pycFile)[0] + '.py'
+    for folder in [pyFolder] + [os.path.join(result_folder, pyFolder) for result_folder in RESULT_FOLDERS]:
+        for prefix in [''] + RESULT_PREFIXES:
+            path = os.path.join(dest_folder, folder, prefix + pyFile)
+            if os.path.isfile(path):
+                os.remove(path)
+
+# Compares the entries of the game's script archives against the manifest of the previous run.
+# Returns the (zip filename, destination subfolder, ZipInfo) of every entry to process and the manifest
+# for this run, which should be saved once decompiling has finished.  Outside of incremental mode every
+# entry is returned.  In incremental mode only new entries or those whose CRC or size changed are returned,
+# the outputs of changed modules are cleared (they may land in a different result subfolder) and the
+# outputs of modules that no longer exist in the game are deleted.
+def scan_script_zip_files(zip_folder, dest_folder, incremental=False, remove_outputs=True):
+    old_manifest = load_manifest(dest_folder) if incremental else {}
+    manifest = {}
+    changed = []
+    removed = 0
+    for zip_filename, subFolder in get_script_zip_files(zip_folder):
+        with zipfile.ZipFile(zip_filename) as zip:
+            infolist = zip.infolist()
+        old_entries = old_manifest.get(subFolder, {})
+        entries = {}
+        for info in infolist:
+            if info.is_dir():
+                continue
+            entries[info.filename] = [info.CRC, info.file_size]
+            if not incremental or old_entries.get(info.filename) != entries[info.filename]:
+                if info.filename in old_entries and remove_outputs:
+                    remove_decompiled_outputs(dest_folder, subFolder, info.filename)
+                changed.append((zip_filename, subFolder, info))
+        for name in old_entries:
+            if name not in entries and remove_outputs:
+                remove_decompiled_outputs(dest_folder, subFolder, name)
+                removed += 1
+        manifest[subFolder] = entries
+    if incremental:
+        print('Found {} new or changed files, removed {} deleted files'.format(len(changed), removed))
+    return changed, manifest
+
+
+# Decompile the contents of a .pyc file with several decompilers at once (-R), each on its own thread.
+# As soon as one produces a PERFECT result the others are cancelled, otherwise the best result is kept.
+# Of two GOOD results the one with fewer functions that differ from the original wins, remaining ties
+# and results without source code go to the earlier decompiler.
+# Returns the DecompileResultData and output of the winner and the DecompileResultData of every attempt.
+def race_decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, decompilers, py37dec_timeout, cache=None, pycFullFilename=None, compare_budget=None, memory_limit=0):
+    cancel_event = threading.Event()
+    finished = queue.Queue()
+    def run(decompiler):
+        try:
+            finished.put(decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, cache, pycFullFilename, compare_budget, memory_limit, cancel_event))
+        except BaseException as ex:
+            finished.put(ex)
+    threads = [threading.Thread(target=run, args=(decompiler,), daemon=True) for decompiler in decompilers]
+    for thread in threads:
+        thread.start()
+
+    attempts = []
+    try:
+        for thread in threads:
+            attempt = finished.get()
+            if isinstance(attempt, BaseException):
+                raise attempt
+            attempts.append(attempt)
+            if attempt[0].result == 0:
+                break
+    finally:
+        # Stop the decompiles still running, py37dec checks the cancel event and the watchdog interrupts unpyc3
+        cancel_event.set()
+        watchdog = memory_monitor.get_watchdog()
+        for thread in threads:
+            watchdog.cancel(thread.ident)
+        for thread in threads:
+            thread.join()
+    finished_attempts = [attempt for attempt in attempts if not attempt[0].cancelled]
+    result, output = min(finished_attempts, key=lambda attempt: (min(attempt[0].result, 3), len(attempt[0].mismatched_functions), decompilers.index(attempt[0].decompiler)))
+    while not finished.empty():
+        attempt = finished.get()
+        if not isinstance(attempt, BaseException):
+            attempts.append(attempt)
+    return result, output, [attempt[0] for attempt in attempts]
 
+# Name of the fallback for unpyc3 when py37dec is not available: unpyc3 again, leaving out the
+# top-level statements it fails to decompile, as the Utilities.compiler fallback used to
+UNPYC3_PARTIAL = 'unpyc3-partial'
 
-# Launch "threads" and summarize results
-def main(src_folder, dest_folder, prefix_filenames=False, max_threads=DEFAULT_MAX_THREADS, results_file=None, test_large_codeobjects=False, large_codeobjects_threshold=10000, comment_style=0, py37dec_timeout=5, split_result_folders=False):
-    global total, DEFAULT_DECOMPILER
-    from shutil import copyfile
-    from Utilities.compiler import decompile_file as unpyc3_decompile
+# Returns the decompiler to retry with when the given one fails, or None if it is not available.
+# Without py37dec, unpyc3 is retried keeping only the statements it can decompile (UNPYC3_PARTIAL).
+def get_alternative_decompiler(decompiler):
+    if decompiler == 'unpyc3':
+        return 'py37dec' if PY37DEC_AVAILABLE else UNPYC3_PARTIAL
+    return 'unpyc3' if UNPYC3_AVAILABLE else None
 
+# Decompile a single .pyc file, retrying with the alternative decompiler if the first attempt
+# fails.  This is the unit of work handed to each "thread" in the pool, so it must be a module
+# level function and only take picklable arguments.
+# When zip_filename is given the .pyc is read straight from that Zip file's member instead of srcFolder.
+# With defer_timeout, a py37dec timeout is returned as a deferred result without trying the alternative
+# decompiler or writing any output, so the file can be retried later with a longer timeout.
+# With race, both decompilers run at once instead of the alternative only after a failure.
+# With merge_functions, the functions that differ in an otherwise good result are taken from the alternative decompiler.
+def decompile_job(srcFolder, destFolder, subFolder, pycFile, prefix_filenames, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, split_result_folders, cache=None, zip_filename=None, member=None, compare_budget=None, estimated_cost=-1, defer_timeout=False, memory_limit=0, race=False, merge_functions=False):
     timer = Timer()
-    if py37dec_timeout == 0:
-        py37dec_timeout = None
+    file_name = os.path.splitext(pycFile)[0]
+    pyFile = file_name + '.py'
+    pycFullFilename = None
+    if zip_filename:
+        pyc_data = read_zip_member(zip_filename, member)
+        pycFilename = os.path.join(os.path.realpath(zip_filename), member)
+    else:
+        pycFullFilename = os.path.join(srcFolder, subFolder, pycFile)
+        pycFilename = os.path.realpath(pycFullFilename)
+        with open(pycFullFilename, 'rb') as fp:
+            pyc_data = fp.read()
+    read_time = timer.elapsed_time()
+    sys.stdout.write(pycFilename + '\n')
+
+    alternative_decompiler = get_alternative_decompiler(decompiler)
+    # Racing and merging functions need the other decompiler, not a partial rerun of the same one
+    other_decompiler = alternative_decompiler if alternative_decompiler != UNPYC3_PARTIAL else None
+    race = race and other_decompiler is not None
+    merge_decompiler = other_decompiler if merge_functions else None
+
+    # When the first decompiler failed on this file in an earlier run and the alternative's result was
+    # kept, the job records that in the cache.  A failure the cache cannot hold, like a timeout, would
+    # otherwise run the first decompiler again on every run before the cached alternative result is used.
+    # The timeout and memory limit are part of the key, so a run with a longer timeout or a higher limit
+    # tries the first decompiler again.
+    job_key = None
+    cached_alternative = None
+    if cache and alternative_decompiler and not race:
+        job_key = cache.make_key(pyc_data, 'job', get_cache_key(cache, pyc_data, pyFile, large_codeobjects_threshold, comment_style, decompiler, compare_budget, merge_decompiler), alternative_decompiler, get_decompiler_version(alternative_decompiler), py37dec_timeout, memory_limit)
+        job = cache.get(job_key)
+        if job and job[0].get('decompiler') == alternative_decompiler:
+            cached_alternative = get_cached_result(cache, get_cache_key(cache, pyc_data, pyFile, large_codeobjects_threshold, comment_style, alternative_decompiler, compare_budget), pycFilename, alternative_decompiler)
+
+    if race:
+        result, output, attempts = race_decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, [decompiler, alternative_decompiler], py37dec_timeout, cache, pycFullFilename, compare_budget, memory_limit)
+        py37dec_time = -1
+        for attempt in attempts:
+            if attempt.decompiler == 'py37dec' and not attempt.cancelled:
+                py37dec_time = attempt.decompile_time
+            result.peak_rss = max(result.peak_rss, attempt.peak_rss)
+        print('{} won the race.'.format(result.decompiler))
+    elif cached_alternative:
+        result, output = cached_alternative
+        py37dec_time = -1
+        print('{} failed on this file before, using the cached {} result.'.format(decompiler, alternative_decompiler))
+    else:
+        result, output = decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, decompiler, py37dec_timeout, cache, pycFullFilename, compare_budget, memory_limit, None, merge_decompiler)
+        py37dec_time = result.decompile_time if decompiler == 'py37dec' else -1
+    if result.result == 4 and defer_timeout:
+        print('Timed out after {} seconds, will retry at the end of the run.'.format(py37dec_timeout))
+        result.deferred = True
+    elif not is_success(result) and alternative_decompiler and not race and not cached_alternative:
+        # The .pyc contents are still in memory, so the alternative decompiler goes through exactly
+        # the same verification, and the better of the two results is kept.
+        print('Failed to decompile file, attempting to use alternative decompiler.')
+        alternative_result, alternative_output = decompile_pyc(pyc_data, pycFilename, pyFile, large_codeobjects_threshold, comment_style, alternative_decompiler, py37dec_timeout, cache, pycFullFilename, compare_budget, memory_limit)
+        if alternative_decompiler == 'py37dec':
+            py37dec_time = alternative_result.decompile_time
+        # Only keep the alternative result if it actually produced source code
+        discarded_result = alternative_result
+        if alternative_result.result < min(result.result, 3):
+            if is_success(alternative_result):
+                print('Success! File decompiled successfully via alternative method.')
+            discarded_result = result
+            result, output = alternative_result, alternative_output
+            if job_key:
+                cache.put(job_key, '', {'decompiler': alternative_decompiler})
+        # The phase times and peak memory of the kept result cover both attempts
+        for phase, phase_time in discarded_result.phase_times.items():
+            result.phase_times[phase] = result.phase_times.get(phase, 0) + phase_time
+        result.peak_rss = max(result.peak_rss, discarded_result.peak_rss)
+        if not is_success(result):
+            print('Failed to decompile, even with alternative decompiler')
+    if not result.deferred:
+        write_decompile_output(result, output, destFolder, subFolder, pyFile, prefix_filenames, split_result_folders)
 
-    # Create our "thread" pool
-    results = []
-    #pool = multiprocessing.Pool(processes=max_threads)
+        # The .pyc is removed when decompiling in place, but only by completed_callback() once the result
+        # is in the journal, so an interrupted run can always be resumed
+        result.remove_pyc = bool(pycFullFilename and srcFolder == destFolder)
+    result.module = get_module_name(subFolder, pycFile)
+    result.size = len(pyc_data)
+    result.estimated_cost = estimated_cost
+    result.actual_cost = timer.elapsed_time()
+    result.py37dec_time = py37dec_time
+    result.py37dec_timeout = py37dec_timeout
+    result.phase_times['read'] = read_time
+    result.worker = os.getpid()
+    return result
 
-    print('Decompiling all files in {} using {}, please wait'.format(src_folder, DEFAULT_DECOMPILER))
 
-    # Search the source folder for all .pyc files and add a call to decompile()
-    # to the "thread" pool.
+# Returns the path of a module relative to the source folder, in the same form for every OS and source
+def get_module_name(subFolder, pycFile):
+    return posixpath.normpath(posixpath.join(subFolder.replace(os.sep, '/'), pycFile))
+
+# Returns the (srcFolder, subFolder, pycFile, zip filename, zip member, size) of every .pyc file in src_folder
+def get_folder_source_files(src_folder):
     srcFolder = os.path.realpath(src_folder)
-    destFolder = os.path.realpath(dest_folder)
+    source_files = []
     for root, subFolders, files in os.walk(src_folder):
         files = [f for f in files if os.path.splitext(f)[1].lower() == '.pyc']
         for pycFile in files:
-            total += 1
-            subFolder = os.path.relpath(root, srcFolder)
-            file_name = os.path.splitext(pycFile)[0]
-            pyFile = file_name + '.py'
-            pyFullFilename = os.path.join(srcFolder, subFolder, pyFile)
-            copiedFilePath = os.path.join(srcFolder, subFolder, pycFile + '_copied')
-            pycFullFilename = os.path.join(srcFolder, subFolder, pycFile)
-            copyfile(pycFullFilename, copiedFilePath)
-            sys.stdout.write(os.path.join(src_folder, subFolder, pycFile) + '\n')
-            result = decompile(srcFolder, destFolder, subFolder, pycFile, pyFile, prefix_filenames, large_codeobjects_threshold, comment_style, DECOMPILER, py37dec_timeout, split_result_folders)
-            if not is_success(result):
-                print('Failed to decompile file, attempting to use alternative decompiler.')
-                os.remove(pyFullFilename)
-                copyfile(copiedFilePath, pycFullFilename)
-                os.remove(copiedFilePath)
-                if not unpyc3_decompile(pycFullFilename, throw_on_error=False):
-                    print('Failed to decompile, even with alternative decompiler')
-                else:
-                    print('Success! File decompiled successfully via alternative method.')
-                    os.remove(pycFullFilename)
-                    result = DecompileResultData(os.path.realpath(pycFullFilename))
-                    result.result = 1
+            source_files.append((srcFolder, os.path.relpath(root, srcFolder), pycFile, None, None, os.path.getsize(os.path.join(root, pycFile))))
+    return source_files
+
+# Returns the (srcFolder, subFolder, pycFile, zip filename, zip member, size) of every .pyc entry of the game
+# Zip files, these are decompiled straight from the Zip files without extracting them.
+def get_zip_source_files(zip_folder, dest_folder, incremental=False, remove_outputs=True):
+    changed, manifest = scan_script_zip_files(zip_folder, dest_folder, incremental, remove_outputs)
+    return get_zip_entry_source_files(changed, os.path.realpath(zip_folder)), manifest
+
+# Returns the (srcFolder, subFolder, pycFile, zip filename, zip member, size) of every .pyc entry in the
+# (zip filename, destination subfolder, ZipInfo) entries returned by scan_script_zip_files()
+def get_zip_entry_source_files(entries, srcFolder):
+    source_files = []
+    for zip_filename, zipSubFolder, info in entries:
+        folder, pycFile = posixpath.split(info.filename)
+        if os.path.splitext(pycFile)[1].lower() != '.pyc':
+            continue
+        subFolder = os.path.normpath(os.path.join(zipSubFolder, folder))
+        source_files.append((srcFolder, subFolder, pycFile, zip_filename, info.filename, info.file_size))
+    return source_files
+
+# Extracts the given Zip entries to dest_folder in parallel and yields the (srcFolder, subFolder, pycFile,
+# zip filename, zip member, size, estimated cost) of each .pyc file among source_files as soon as it has
+# been extracted, now to be read from dest_folder.  The entries are started in the order of source_files,
+# entries that are not .pyc files come last.
+def extract_source_files(entries, source_files, dest_folder):
+    destFolder = os.path.realpath(dest_folder)
+    members = {(zip_filename, info.filename): (zip_filename, info, os.path.join(dest_folder, zipSubFolder)) for zip_filename, zipSubFolder, info in entries}
+    pyc_members = [members.pop((source_file[3], source_file[4])) + ((destFolder,) + source_file[1:3] + (None, None) + source_file[5:],) for source_file in source_files]
+    # Skip the .pyc entries that are not to be decompiled, when resuming
+    other_members = [member + (None,) for member in members.values() if os.path.splitext(member[1].filename)[1].lower() != '.pyc']
+    for member, path in parallel_unzip.extract_members(pyc_members + other_members):
+        if member[3]:
+            yield member[3]
+
+
+# Returns the given percentile of a list of values using the nearest rank method
+def get_percentile(values, percentile):
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percentile / 100) - 1, 0)]
+
+# Returns the py37dec timeout in seconds for a module in adaptive timeout mode (-A), from its size and
+# the py37dec times recorded in the timing history
+def get_adaptive_timeout(history, module, size, max_timeout):
+    expected_time = history.estimate(module, size, 'py37dec_time')
+    return round(min(max(expected_time * ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_MIN), max_timeout), 1)
+
+# A decompile session owns the "thread" pool, the result buckets and counters, and the open results log
+# and journal of its runs.  The pool is started on the first run and kept warm for later runs until
+# close(), and each run starts from empty buckets.  A session does one run at a time, separate sessions
+# can run concurrently.  A single threaded session decompiles in the calling process, where the memory
+# limit applies to the memory used by the whole process, including any concurrent single threaded sessions.
+class DecompileSession():
+    # decompiler is the default decompiler ('py37dec' or 'unpyc3'), max_threads the number of
+    # simultaneous decompile "threads" and max_tasks the files each thread process decompiles before
+    # it is replaced (0 = never)
+    def __init__(self, decompiler=None, max_threads=DEFAULT_MAX_THREADS, max_tasks=0):
+        # DECOMPILER is only set when run from the command line, otherwise use the configured default
+        self.decompiler = decompiler or DECOMPILER or DEFAULT_DECOMPILER
+        self.max_threads = max_threads
+        self.max_tasks = max_tasks
+        self.pool = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    # Empty the result buckets and counters
+    def reset(self):
+        self.perfect = []
+        self.good = []
+        self.syntax = []
+        self.failed = []
+        self.timeout = []
+        self.deferred = []
+        self.completed = 0
+        self.total = 0
+        # Open results log (-l), each result is appended to it as soon as it is bucketed
+        self.results_log = None
+        # Open journal of the run, each result is written to it before the .pyc is removed or the next result
+        # bucketed, and it is synced to disk every JOURNAL_SYNC_INTERVAL seconds or before a .pyc is removed
+        self.journal = None
+        self.journal_synced = 0
+
+    # Returns the results of every file in the last run, in bucket order
+    def get_results(self):
+        return [decompile_result for bucket in [self.perfect, self.good, self.syntax, self.failed, self.timeout] for decompile_result in bucket]
+
+    # Create our "thread" pool.  With a single thread everything runs in this process, which
+    # keeps tracebacks and debugging simple.  With max_tasks each thread process is replaced after
+    # that many files, returning any memory it still holds to the system.
+    def start(self):
+        if self.pool is None and self.max_threads > 1:
+            self.pool = multiprocessing.Pool(processes=self.max_threads, maxtasksperchild=self.max_tasks or None)
+
+    # Shut down the "thread" pool
+    def close(self):
+        if self.pool:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    # A completed thread will issue this callback in the main thread, place the
+    # DecompileResultData into a bucket depending on the returned result.
+    def completed_callback(self, result) -> bool:
+        if result.deferred:
+            # Timed out in adaptive timeout mode, the file is bucketed once it has been retried
+            self.deferred.append(result)
+            return False
+        self.completed += 1
+        if self.journal:
+            self.journal.write(json.dumps(result.to_dict()) + '\n')
+            self.journal.flush()
+            # The entry of a .pyc that is about to be removed is synced right away, the entry is all that is
+            # left of the .pyc once it is gone
+            if result.remove_pyc or time.perf_counter() - self.journal_synced >= JOURNAL_SYNC_INTERVAL:
+                os.fsync(self.journal.fileno())
+                self.journal_synced = time.perf_counter()
+        if result.remove_pyc:
+            os.remove(result.pycFilename)
+        if self.results_log:
+            self.results_log.write(json.dumps(result.to_dict()) + '\n')
+            self.results_log.flush()
+
+        # Write percentage complete to stdout
+        #sys.stdout.write('\b\b\b\b{:3}%'.format(int(self.completed/self.total*100)))
+        #sys.stdout.flush()
+
+        if result.result == 0:
+            self.perfect.append(result)
+            return True
+        elif result.result == 1:
+            self.good.append(result)
+            return True
+        elif result.result == 2:
+            print('syntax')
+            self.syntax.append(result)
+            return False
+        elif result.result == 3:
+            print('failed')
+            self.failed.append(result)
+            return False
+        else:
+            print('timeout')
+            self.timeout.append(result)
+            return False
+
+    # A "thread" that raised an unexpected exception will issue this callback in the main thread
+    # instead of completed_callback().  The file is bucketed as a failure so the summary still adds up.
+    def job_error_callback(self, pycFilename, module, ex):
+        print('Unexpected error decompiling {}: {}'.format(pycFilename, ex))
+        result = DecompileResultData(os.path.realpath(pycFilename))
+        result.module = module
+        result.result = 3
+        self.completed_callback(result)
+
+    # Start a decompile job in the "thread" pool, or run it right away with a single thread.
+    # job_args are the keyword arguments of decompile_job().
+    def submit(self, job_args, pycFilename, module):
+        if self.pool:
+            return self.pool.apply_async(decompile_job, kwds=job_args, callback=self.completed_callback, error_callback=functools.partial(self.job_error_callback, pycFilename, module))
+        self.completed_callback(decompile_job(**job_args))
+        return None
+
+    # Decompile every file, summarize the results and return the DecompileResultData of every file.
+    # If src_folder is None, the scripts are decompiled straight from the game Zip files in zip_folder.
+    def run(self, src_folder, dest_folder, prefix_filenames=False, results_file=None, test_large_codeobjects=False, large_codeobjects_threshold=10000, comment_style=0, py37dec_timeout=5, split_result_folders=False, cache_folder=None, cache_size=decompile_cache.DEFAULT_MAX_SIZE, zip_folder=None, incremental=False, compare_budget=DEFAULT_COMPARE_BUDGET, adaptive_timeouts=False, max_timeout=DEFAULT_MAX_TIMEOUT, results_log_file=None, max_memory=0, race=False, merge_functions=False, database_file=None, resume=False, extract=False):
+        with self.lock:
+            self.reset()
+            try:
+                self._run(src_folder, dest_folder, prefix_filenames, results_file, large_codeobjects_threshold, comment_style, py37dec_timeout, split_result_folders, cache_folder, cache_size, zip_folder, incremental, compare_budget, adaptive_timeouts, max_timeout, results_log_file, max_memory, race, merge_functions, database_file, resume, extract)
+            finally:
+                # On an error the journal is left behind, so the run can be resumed
+                if self.results_log:
+                    self.results_log.close()
+                    self.results_log = None
+                if self.journal:
+                    self.journal.flush()
+                    os.fsync(self.journal.fileno())
+                    self.journal.close()
+                    self.journal = None
+            return self.get_results()
+
+    def _run(self, src_folder, dest_folder, prefix_filenames, results_file, large_codeobjects_threshold, comment_style, py37dec_timeout, split_result_folders, cache_folder, cache_size, zip_folder, incremental, compare_budget, adaptive_timeouts, max_timeout, results_log_file, max_memory, race, merge_functions, database_file, resume, extract):
+        timer = Timer()
+        started = time.time()
+        if py37dec_timeout == 0:
+            py37dec_timeout = None
+        cache = decompile_cache.DecompileCache(cache_folder, cache_size) if cache_folder else None
+        decompiler = self.decompiler
+
+        # The results log is written as results arrive, so it survives a crash or interrupted run
+        if results_log_file:
+            self.results_log = open(results_log_file, 'w', encoding='UTF-8')
+
+        if max_memory and not memory_monitor.is_available():
+            print('Memory usage cannot be read on this system, install psutil to use a memory limit')
+
+        self.start()
+
+        # Find all .pyc files in the source folder or game Zip files and add a call to decompile_job()
+        # to the "thread" pool.
+        # When resuming, the outputs of changed Zip entries were already removed by the interrupted run.
+        manifest = None
+        extract = extract and src_folder is None
+        if extract:
+            print('Extracting and decompiling all files in the Zip files in {} using {}, please wait'.format(zip_folder, decompiler))
+            src_folder = dest_folder
+            entries, manifest = scan_script_zip_files(zip_folder, dest_folder, incremental, not resume)
+            source_files = get_zip_entry_source_files(entries, os.path.realpath(dest_folder))
+        elif src_folder is None:
+            src_folder = zip_folder
+            print('Decompiling all files in the Zip files in {} using {}, please wait'.format(zip_folder, decompiler))
+            source_files, manifest = get_zip_source_files(zip_folder, dest_folder, incremental, not resume)
+        else:
+            print('Decompiling all files in {} using {}, please wait'.format(src_folder, decompiler))
+            source_files = get_folder_source_files(src_folder)
+        destFolder = os.path.realpath(dest_folder)
+
+        # When resuming, the files completed by the interrupted run are bucketed from its journal instead of
+        # being decompiled again, unless their .pyc changed size since.  Files decompiled in place may have
+        # been journaled without their .pyc being removed yet.
+        if resume:
+            journaled = load_journal(dest_folder)
+            remaining = []
+            for source_file in source_files:
+                module = get_module_name(source_file[1], source_file[2])
+                if module in journaled and journaled[module].size != source_file[5]:
+                    del journaled[module]
+                if module not in journaled:
+                    remaining.append(source_file)
+            source_files = remaining
+            if journaled:
+                print('Resuming, {} files were already completed'.format(len(journaled)))
             else:
-                os.remove(copiedFilePath)
-            completed_callback(result)
-            results.append(result)
-
-    # Print results summary and CSV results file if requested
-    sys.stdout.write('\b\b\b\b\b\b')
-    if total == 0:
-        print('      \nError, no compiled Python files found in source folder')
-        return
-    print('Completed')
-
-    print('\nperfect\t= {} ({:0.1f}%)'.format(len(perfect), len(perfect)/total*100))
-    print('good\t= {} ({:0.1f}%)'.format(len(good), len(good)/total*100))
-    print('syntax\t= {} ({:0.1f}%)'.format(len(syntax), len(syntax)/total*100))
-    print('failure\t= {} ({:0.1f}%)'.format(len(failed), len(failed)/total*100))
-    if len(timeout) > 0:
-        print('timeout\t= {} ({:0.1f}%)'.format(len(timeout), len(timeout)/total*100))
-    print('{:0.2f} seconds'.format(timer.elapsed_time()))
-
-    if results_file:
-        with open(results_file, 'w', encoding='UTF-8') as fp:
-            fp.write(' ,Compiled,Decompiled,Decompile,Compare\nResult,Path,Path,Time,Time\n')
-            for decompile_result in perfect:
-                fp.write('PERFECT,{},{},{},{}\n'.format(os.path.relpath(decompile_result.pycFilename, src_folder), os.path.relpath(decompile_result.pyFilename, dest_folder), decompile_result.decompile_time, decompile_result.analyze_time))
-            for decompile_result in good:
-                fp.write('GOOD,{},{},{},{}\n'.format(os.path.relpath(decompile_result.pycFilename, src_folder), os.path.relpath(decompile_result.pyFilename, dest_folder), decompile_result.decompile_time, decompile_result.analyze_time))
-            for decompile_result in failed:
-                fp.write('FAILED,{},{},{},{}\n'.format(os.path.relpath(decompile_result.pycFilename, src_folder), os.path.relpath(decompile_result.pyFilename, dest_folder), decompile_result.decompile_time, decompile_result.analyze_time))
-            for decompile_result in syntax:
-                fp.write('SYNTAX,{},{},{},{}\n'.format(os.path.relpath(decompile_result.pycFilename, src_folder), os.path.relpath(decompile_result.pyFilename, dest_folder), decompile_result.decompile_time, decompile_result.analyze_time))
-            for decompile_result in timeout:
-                fp.write('TIMEOUT,{},{},{},{}\n'.format(os.path.relpath(decompile_result.pycFilename, src_folder), os.path.relpath(decompile_result.pyFilename, dest_folder), decompile_result.decompile_time, decompile_result.analyze_time))
+                print('No interrupted run to resume in {}'.format(dest_folder))
+            for journaled_result in journaled.values():
+                if journaled_result.remove_pyc:
+                    if os.path.isfile(journaled_result.pycFilename):
+                        os.remove(journaled_result.pycFilename)
+                    journaled_result.remove_pyc = False
+                self.total += 1
+                self.completed_callback(journaled_result)
+
+        # Every result is journaled as it completes, so an interrupted run can be resumed
+        os.makedirs(dest_folder, exist_ok=True)
+        self.journal = open(os.path.join(dest_folder, JOURNAL_FILENAME), 'a' if resume else 'w', encoding='UTF-8')
+
+        # Estimate the cost of every module from its size and recorded timings.  With several "threads" the
+        # most expensive modules are started first (longest processing time first), so a few huge modules
+        # found last cannot leave one thread working long after the others have finished.
+        history = timing_history.TimingHistory(os.path.join(dest_folder, TIMINGS_FILENAME))
+        source_files = [source_file + (history.estimate(get_module_name(source_file[1], source_file[2]), source_file[5]),) for source_file in source_files]
+        if self.pool:
+            source_files.sort(key=lambda source_file: source_file[6], reverse=True)
+
+        # Extracted Zip entries are decompiled in place, each one as soon as it has been extracted
+        if extract:
+            source_files = extract_source_files(entries, source_files, dest_folder)
+
+        # In adaptive timeout mode each file gets a py37dec timeout in line with the time py37dec took on it
+        # before, instead of the same timeout for every file.  Until any py37dec times have been recorded
+        # every file gets the default timeout.  Either way, timeouts are retried at the end of the run.
+        adaptive_timeouts = adaptive_timeouts and py37dec_timeout is not None and decompiler == 'py37dec'
+        learned_timeouts = adaptive_timeouts and history.has_timing('py37dec_time')
+        jobs = {}
+        async_results = []
+        for srcFolder, subFolder, pycFile, zip_filename, member, size, estimated_cost in source_files:
+            self.total += 1
+            module = get_module_name(subFolder, pycFile)
+            job_timeout = get_adaptive_timeout(history, module, size, max_timeout) if learned_timeouts else py37dec_timeout
+            job_args = dict(srcFolder=srcFolder, destFolder=destFolder, subFolder=subFolder, pycFile=pycFile, prefix_filenames=prefix_filenames, large_codeobjects_threshold=large_codeobjects_threshold, comment_style=comment_style, decompiler=decompiler, py37dec_timeout=job_timeout, split_result_folders=split_result_folders, cache=cache, zip_filename=zip_filename, member=member, compare_budget=compare_budget, estimated_cost=estimated_cost, defer_timeout=adaptive_timeouts and job_timeout < max_timeout, memory_limit=max_memory, race=race, merge_functions=merge_functions)
+            jobs[module] = job_args
+            async_results.append(self.submit(job_args, os.path.join(srcFolder, subFolder, pycFile), module))
+
+        # Wait for all of the "threads" to finish, each one reports back through completed_callback()
+        for async_result in async_results:
+            if async_result:
+                async_result.wait()
+
+        # Retry the files that timed out once, with an escalated timeout.  These are left until last so
+        # a few slow files cannot hold up the rest, and this time a timeout is final.  Files that already
+        # had the maximum timeout are not deferred.  The pool stays up for the next run, so the retries
+        # are waited for individually.
+        if self.deferred:
+            print('Retrying {} timed out files with longer timeouts'.format(len(self.deferred)))
+        retries = self.deferred[:]
+        self.deferred.clear()
+        for deferred_result in retries:
+            retry_args = dict(jobs[deferred_result.module], py37dec_timeout=min(deferred_result.py37dec_timeout * ADAPTIVE_TIMEOUT_ESCALATION, max_timeout), defer_timeout=False)
+            async_results.append(self.submit(retry_args, deferred_result.pycFilename, deferred_result.module))
+        for async_result in async_results[len(jobs):]:
+            if async_result:
+                async_result.wait()
+
+        # The run is complete, there is nothing left to resume
+        self.journal.close()
+        self.journal = None
+        os.remove(os.path.join(dest_folder, JOURNAL_FILENAME))
+        if cache:
+            cache.evict()
+        if manifest is not None:
+            save_manifest(dest_folder, manifest)
+
+        # Record the timings of this run for the next one, cached results took no real decompiling time
+        for decompile_result in self.get_results():
+            if decompile_result.module and not decompile_result.cached:
+                history.record(decompile_result.module, decompile_result.size, decompile_result.decompile_time, decompile_result.actual_cost, decompile_result.py37dec_time)
+        if self.total:
+            history.save()
+
+        # Record the run in the run database, with the settings that influence the results
+        if database_file and self.total:
+            game_folders = [os.path.join(zip_folder, '../../..'), os.path.join(zip_folder, '../..')] if zip_folder else []
+            settings = {'max_threads': self.max_threads, 'large_codeobjects_threshold': large_codeobjects_threshold, 'comment_style': comment_style, 'py37dec_timeout': py37dec_timeout,
+                        'compare_budget': compare_budget, 'cache': bool(cache), 'incremental': incremental, 'adaptive_timeouts': adaptive_timeouts, 'race': race,
+                        'merge_functions': merge_functions, 'max_memory': max_memory}
+            run_database.record_run(database_file, started, timer.elapsed_time(), run_database.get_game_version(game_folders + [game_folder]), decompiler, settings, self.get_results())
+
+        # Print results summary and CSV results file if requested
+        sys.stdout.write('\b\b\b\b\b\b')
+        if self.total == 0:
+            if incremental and manifest is not None:
+                print('      \nNo new or changed files to decompile')
+            else:
+                print('      \nError, no compiled Python files found in source folder')
+            return
+        print('Completed')
+
+        print('\nperfect\t= {} ({:0.1f}%)'.format(len(self.perfect), len(self.perfect)/self.total*100))
+        print('good\t= {} ({:0.1f}%)'.format(len(self.good), len(self.good)/self.total*100))
+        print('syntax\t= {} ({:0.1f}%)'.format(len(self.syntax), len(self.syntax)/self.total*100))
+        print('failure\t= {} ({:0.1f}%)'.format(len(self.failed), len(self.failed)/self.total*100))
+        if len(self.timeout) > 0:
+            print('timeout\t= {} ({:0.1f}%)'.format(len(self.timeout), len(self.timeout)/self.total*100))
+        if cache:
+            cached = sum(1 for decompile_result in self.get_results() if decompile_result.cached)
+            print('cached\t= {} ({:0.1f}%)'.format(cached, cached/self.total*100))
+        skipped_files = [decompile_result for decompile_result in self.get_results() if decompile_result.skipped_instructions]
+        if skipped_files:
+            skipped = sum(sum(decompile_result.skipped_instructions.values()) for decompile_result in skipped_files)
+            print('skipped\t= {} instructions in {} files'.format(skipped, len(skipped_files)))
+        print('{:0.2f} seconds'.format(timer.elapsed_time()))
+
+        # Latency of the jobs in each bucket, in seconds
+        print('\nlatency\tp50\tp95\tp99')
+        for bucket_name, bucket in [('perfect', self.perfect), ('good', self.good), ('syntax', self.syntax), ('failure', self.failed), ('timeout', self.timeout)]:
+            costs = [decompile_result.actual_cost for decompile_result in bucket if decompile_result.actual_cost >= 0]
+            if costs:
+                print('{}\t{:0.3f}\t{:0.3f}\t{:0.3f}'.format(bucket_name, get_percentile(costs, 50), get_percentile(costs, 95), get_percentile(costs, 99)))
+
+        if results_file:
+            with open(results_file, 'w', encoding='UTF-8') as fp:
+                fp.write(' ,Compiled,Decompiled,Decompile,Compare,Code,Estimated,Actual,py37dec,Peak, \nResult,Path,Path,Time,Time,Hash,Cost,Cost,Timeout,Memory,Decompiler\n')
+                for result_name, bucket in [('PERFECT', self.perfect), ('GOOD', self.good), ('FAILED', self.failed), ('SYNTAX', self.syntax), ('TIMEOUT', self.timeout)]:
+                    for decompile_result in bucket:
+                        pyFilename = os.path.relpath(decompile_result.pyFilename, dest_folder) if decompile_result.pyFilename else ''
+                        fp.write('{},{},{},{},{},{},{},{},{},{},{}\n'.format(result_name, os.path.relpath(decompile_result.pycFilename, src_folder), pyFilename, decompile_result.decompile_time, decompile_result.analyze_time, decompile_result.code_hash, decompile_result.estimated_cost, decompile_result.actual_cost, decompile_result.py37dec_timeout or '', decompile_result.peak_rss, decompile_result.decompiler or ''))
+
+
+# Launch "threads" and summarize results in a session of its own
+# If src_folder is None, the scripts are decompiled straight from the game Zip files in zip_folder.
+def main(src_folder, dest_folder, prefix_filenames=False, max_threads=DEFAULT_MAX_THREADS, results_file=None, test_large_codeobjects=False, large_codeobjects_threshold=10000, comment_style=0, py37dec_timeout=5, split_result_folders=False, cache_folder=None, cache_size=decompile_cache.DEFAULT_MAX_SIZE, zip_folder=None, incremental=False, compare_budget=DEFAULT_COMPARE_BUDGET, adaptive_timeouts=False, max_timeout=DEFAULT_MAX_TIMEOUT, results_log_file=None, max_memory=0, max_tasks=0, race=False, merge_functions=False, database_file=None, resume=False, extract=False):
+    with DecompileSession(max_threads=max_threads, max_tasks=max_tasks) as session:
+        return session.run(src_folder, dest_folder, prefix_filenames=prefix_filenames, results_file=results_file, large_codeobjects_threshold=large_codeobjects_threshold, comment_style=comment_style, py37dec_timeout=py37dec_timeout, split_result_folders=split_result_folders, cache_folder=cache_folder, cache_size=cache_size, zip_folder=zip_folder, incremental=incremental, compare_budget=compare_budget, adaptive_timeouts=adaptive_timeouts, max_timeout=max_timeout, results_log_file=results_log_file, max_memory=max_memory, race=race, merge_functions=merge_functions, database_file=database_file, resume=resume, extract=extract)
 
 # Setup and parse command line options, calling main() with all desired options
 if __name__ == '__main__':
@@ -595,13 +1629,28 @@ if __name__ == '__main__':
     parser.add_argument('-p', action='store_true', dest='prefix_filenames', help='prefix output filenames with [RESULT]')
     parser.add_argument('-t', nargs=1, type=int, metavar='N', default=[DEFAULT_MAX_THREADS], dest='max_threads', help='number of simultaneous decompile threads to use')
     parser.add_argument('-r', nargs='?', metavar='FILENAME', default=argparse.SUPPRESS, dest='results_file', help='create CSV file containing results for decompiled files')
-    parser.add_argument('-L', nargs='?', type=int, metavar='N', default=argparse.SUPPRESS, dest='large_codeobjects_threshold', help='code objects with >N bytes will not be analyzed')
+    parser.add_argument('--db', nargs='?', metavar='DATABASE', default=argparse.SUPPRESS, dest='database_file', help='record the run and the results of every file in a SQLite database (default ./decompile_runs.db)')
+    parser.add_argument('-l', nargs='?', metavar='FILENAME', default=argparse.SUPPRESS, dest='results_log_file', help='log the results and phase timings of each file to a JSON lines file as it completes')
+    parser.add_argument('-L', nargs='?', type=int, metavar='N', default=argparse.SUPPRESS, dest='large_codeobjects_threshold', help='code objects with >N bytes are compared with a faster, less detailed diff')
     parser.add_argument('-c', nargs=1, metavar='none|detail', choices=['none', 'detail'], default=argparse.SUPPRESS, dest='comment_style', help='prefix decompiled files with test results comment (default brief)')
     if UNPYC3_AVAILABLE:
         parser.add_argument('-U', action='store_true', dest='use_unpyc3', help='use unpyc3 for decompilation')
     if PY37DEC_AVAILABLE:
         parser.add_argument('-P', action='store_true', dest='use_py37dec', help='use py37dec for decompilation')
+        if UNPYC3_AVAILABLE:
+            parser.add_argument('-F', action='store_true', dest='merge_functions', help='re-decompile only the functions that differ from the original with the other decompiler, and merge them into the file')
+            parser.add_argument('-R', action='store_true', dest='race', help='race unpyc3 and py37dec on every file and keep the better result')
         parser.add_argument('-T', nargs=1, type=int, metavar='SEC', default=[5], dest='py37dec_timeout', help='py37dec only: override timeout in seconds (0=no limit, default 5)')
+        parser.add_argument('-A', action='store_true', dest='adaptive_timeouts', help='py37dec only: adapt the timeout of each file to its size and recorded decompile times, and retry files that time out once at the end with a longer timeout')
+        parser.add_argument('--max-timeout', nargs=1, type=int, metavar='SEC', default=[DEFAULT_MAX_TIMEOUT], dest='max_timeout', help='py37dec only: upper limit for adaptive timeouts (default 120)')
+    parser.add_argument('--cache', nargs='?', metavar='CACHE_FOLDER', default=argparse.SUPPRESS, dest='cache_folder', help='reuse results for unchanged .pyc files from CACHE_FOLDER (default ./decompile_cache)')
+    parser.add_argument('--cache-size', nargs=1, type=int, metavar='MB', default=[decompile_cache.DEFAULT_MAX_SIZE // (1024 * 1024)], dest='cache_size', help='maximum size of the decompile cache in megabytes (default 1024)')
+    parser.add_argument('-I', action='store_true', dest='incremental', help='only extract and decompile Zip entries changed since the last run')
+    parser.add_argument('-x', action='store_true', dest='extract', help='extract the Zip files to DEST_FOLDER in parallel, decompiling each file as soon as it is extracted')
+    parser.add_argument('--compare-budget', nargs=1, type=float, metavar='SEC', default=[DEFAULT_COMPARE_BUDGET], dest='compare_budget', help='time limit for diffing the large code objects of one file (0=no limit, default 30)')
+    parser.add_argument('--max-memory', nargs=1, type=int, metavar='MB', default=[0], dest='max_memory', help='stop decompiling a file once it uses more than MB megabytes of memory (0=no limit, default 0)')
+    parser.add_argument('--resume', action='store_true', dest='resume', help='continue an interrupted run into the same DEST_FOLDER, skipping the files it completed')
+    parser.add_argument('--max-tasks', nargs=1, type=int, metavar='N', default=[0], dest='max_tasks', help='replace each decompile thread with a fresh process after N files (0=never, default 0)')
 
     args = parser.parse_args()
     if hasattr(args, 'use_unpyc3') and hasattr(args, 'use_py37dec') and args.use_unpyc3 and args.use_py37dec:
@@ -617,11 +1666,26 @@ if __name__ == '__main__':
             args.results_file = 'results.csv'
     else:
         args.results_file = None
+    if hasattr(args, 'database_file'):
+        if args.database_file is None:
+            args.database_file = DEFAULT_DATABASE_FILE
+    else:
+        args.database_file = None
+    if hasattr(args, 'results_log_file'):
+        if args.results_log_file is None:
+            args.results_log_file = 'results.jsonl'
+    else:
+        args.results_log_file = None
     if hasattr(args, 'large_codeobjects_threshold'):
         if args.large_codeobjects_threshold is None:
             args.large_codeobjects_threshold = 10000
     else:
         args.large_codeobjects_threshold = None
+    if hasattr(args, 'cache_folder'):
+        if args.cache_folder is None:
+            args.cache_folder = DEFAULT_CACHE_FOLDER
+    else:
+        args.cache_folder = None
     comment_style = 1
     if hasattr(args, 'comment_style'):
         if args.comment_style[0] == 'none':
@@ -630,7 +1694,12 @@ if __name__ == '__main__':
             comment_style = 2
     if not hasattr(args, 'py37dec_timeout'):
         args.py37dec_timeout = [0]
-    if args.src_folder[0] is None:
-        unzip_script_files(args.zip_folder[0], args.dest_folder[0])
-        args.src_folder[0] = args.dest_folder[0]
-    main(args.src_folder[0], args.dest_folder[0], prefix_filenames=args.prefix_filenames, max_threads=args.max_threads[0], results_file=args.results_file, large_codeobjects_threshold=args.large_codeobjects_threshold, comment_style=comment_style, py37dec_timeout=args.py37dec_timeout[0], split_result_folders=args.split_result_folders)
+    if not hasattr(args, 'race'):
+        args.race = False
+        args.merge_functions = False
+    if not hasattr(args, 'adaptive_timeouts'):
+        args.adaptive_timeouts = False
+        args.max_timeout = [DEFAULT_MAX_TIMEOUT]
+    if args.src_folder[0] is not None and args.incremental:
+        print('-I only applies when decompiling from the game Zip files')
+    main(args.src_folder[0], args.dest_folder[0], prefix_filenames=args.prefix_filenames, max_threads=args.max_threads[0], results_file=args.results_file, large_codeobjects_threshold=args.large_codeobjects_threshold, comment_style=comment_style, py37dec_timeout=args.py37dec_timeout[0], split_result_folders=args.split_result_folders, cache_folder=args.cache_folder, cache_size=args.cache_size[0] * 1024 * 1024, zip_folder=args.zip_folder[0], incremental=args.incremental, compare_budget=args.compare_budget[0], adaptive_timeouts=args.adaptive_timeouts, max_timeout=args.max_timeout[0], results_log_file=args.results_log_file, max_memory=args.max_memory[0] * 1024 * 1024, max_tasks=args.max_tasks[0], race=args.race, merge_functions=args.merge_functions, database_file=args.database_file, resume=args.resume, extract=args.extract)
@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import decompiler
+
+
+def compile_source(source):
+    return compile(source, '<test>', 'exec')
+
+
+class CompareCodeobjsTest(unittest.TestCase):
+    def test_identical_code_is_perfect(self):
+        source = 'if a:\n    if b:\n        c()\nd()\n'
+        self.assertEqual(decompiler.compare_codeobjs(compile_source(source), compile_source(source), 10000), '')
+
+    def test_different_jump_target_is_reported(self):
+        # Only the target of the inner jump differs, dis() shows no argrepr for absolute jumps in 3.7
+        pyc_co = compile_source('if a:\n    if b:\n        c()\nd()\n')
+        py_co = compile_source('if a:\n    if b:\n        c()\n    d()\n')
+        self.assertNotEqual(decompiler.compare_codeobjs(pyc_co, py_co, 10000), '')
+
+    def test_large_code_object_diff_lists_only_the_changes(self):
+        body = ''.join('    x{0} = y{0}()\n'.format(i) for i in range(3000))
+        pyc_co = compile_source('def f():\n' + body)
+        py_co = compile_source('def f():\n' + body.replace('    x1500 = y1500()\n', '    x1500 = y1500()\n    z()\n'))
+        err_str = decompiler.compare_codeobjs(pyc_co, py_co, 1000)
+        self.assertIn('LARGE CODE OBJECT DIFF', err_str)
+        self.assertNotIn('DIFF IS APPROXIMATE', err_str)
+        self.assertLess(err_str.count('\n'), 100)
+
+    def test_anchored_diff_reports_gaps_too_large(self):
+        a = list(range(1000))
+        b = list(range(1000, 2000))
+        changes, timed_out, gap_too_large = decompiler.anchored_diff(a + a, b + b)
+        self.assertEqual(changes, [(0, 2000, 0, 2000)])
+        self.assertFalse(timed_out)
+        self.assertTrue(gap_too_large)
+
+
+if __name__ == '__main__':
+    unittest.main()